@@ -0,0 +1,205 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Admission control in front of the routes: token buckets per consumer and
+# per model, plus a global cap on in-flight upstream streams with a short,
+# bounded wait for a free slot. Anything over the limits is rejected quickly
+# with a Retry-After hint instead of queueing on the upstream keys.
+#
+# MemoryStore keeps state in-process. SqliteStore keeps it in a SQLite file so
+# the limits hold across gunicorn workers; slots are leases that expire, so a
+# crashed worker cannot leak capacity. A bucket left idle long enough to
+# refill completely is the same as no bucket, so those are pruned from time
+# to time; one-off consumers don't accumulate.
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def refill(tokens, updated, rate, burst, now):
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def take(self, buckets, now):
+        # buckets: [(key, rate, burst)]. All-or-nothing; returns the wait in
+        # seconds until the scarcest bucket has a token (0 when admitted).
+        with self._lock:
+            levels = []
+            wait = 0.0
+            for key, rate, burst in buckets:
+                tokens, updated = self._buckets.get(key, (burst, now))
+                tokens = refill(tokens, updated, rate, burst, now)
+                levels.append((key, tokens))
+                if tokens < 1.0:
+                    wait = max(wait, (1.0 - tokens) / rate)
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1.0 if not wait else tokens, now)
+            return wait
+
+    def prune(self, before):
+        # Forget buckets last touched before `before`
+        with self._lock:
+            for key in [key for key, (_, updated) in self._buckets.items() if updated < before]:
+                del self._buckets[key]
+
+    def acquire_slot(self, limit, lease, now):
+        with self._lock:
+            for token, expires in list(self._slots.items()):
+                if expires <= now:
+                    del self._slots[token]
+            if len(self._slots) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            self._slots[token] = now + lease
+            return token
+
+    def release_slot(self, token):
+        with self._lock:
+            self._slots.pop(token, None)
+
+
+class SqliteStore:
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)")
+            db.execute("CREATE TABLE IF NOT EXISTS slots (token TEXT PRIMARY KEY, expires REAL)")
+
+    def _connect(self):
+        # One connection per thread and process; never reuse one across fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self._path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _transaction(self, fn):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def take(self, buckets, now):
+        def run(db):
+            levels = []
+            wait = 0.0
+            for key, rate, burst in buckets:
+                row = db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                tokens = refill(tokens, updated, rate, burst, now)
+                levels.append((key, tokens))
+                if tokens < 1.0:
+                    wait = max(wait, (1.0 - tokens) / rate)
+            for key, tokens in levels:
+                db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens - 1.0 if not wait else tokens, now),
+                )
+            return wait
+        return self._transaction(run)
+
+    def prune(self, before):
+        self._connect().execute("DELETE FROM buckets WHERE updated < ?", (before,))
+
+    def acquire_slot(self, limit, lease, now):
+        def run(db):
+            db.execute("DELETE FROM slots WHERE expires <= ?", (now,))
+            (count,) = db.execute("SELECT COUNT(*) FROM slots").fetchone()
+            if count >= limit:
+                return None
+            token = uuid.uuid4().hex
+            db.execute("INSERT INTO slots (token, expires) VALUES (?, ?)", (token, now + lease))
+            return token
+        return self._transaction(run)
+
+    def release_slot(self, token):
+        self._connect().execute("DELETE FROM slots WHERE token = ?", (token,))
+
+
+class Admission:
+    def __init__(self, store, consumer_rate=1.0, consumer_burst=10.0, model_rate=20.0, model_burst=40.0,
+                 max_in_flight=64, max_wait=0.5, max_waiters=32, slot_lease=900.0, poll_interval=0.025,
+                 prune_interval=60.0):
+        self._store = store
+        self._consumer = (consumer_rate, consumer_burst)
+        self._model = (model_rate, model_burst)
+        # Seconds after which an untouched bucket is full again
+        self._refill_time = max([burst / rate for rate, burst in (self._consumer, self._model) if rate > 0] or [0.0])
+        self._prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._max_in_flight = max_in_flight
+        self._max_wait = max_wait
+        self._max_waiters = max_waiters
+        self._slot_lease = slot_lease
+        self._poll_interval = poll_interval
+        self._waiters = 0
+        self._lock = threading.Lock()
+
+    def admit(self, consumer, model):
+        # Raises Rejected when either bucket is empty
+        buckets = []
+        if self._consumer[0] > 0:
+            buckets.append((f"consumer:{consumer}", *self._consumer))
+        if self._model[0] > 0:
+            buckets.append((f"model:{model}", *self._model))
+        if not buckets:
+            return
+        now = time.time()
+        if now >= self._next_prune:
+            self._next_prune = now + self._prune_interval
+            self._store.prune(now - self._refill_time)
+        wait = self._store.take(buckets, now)
+        if wait:
+            raise Rejected("Rate limit exceeded", wait)
+
+    def acquire(self):
+        # Returns a slot token to pass to release(), waiting at most max_wait
+        # for one; raises Rejected when the cap is reached.
+        if self._max_in_flight <= 0:
+            return None
+        token = self._store.acquire_slot(self._max_in_flight, self._slot_lease, time.time())
+        if token is not None:
+            return token
+        with self._lock:
+            if self._waiters >= self._max_waiters:
+                raise Rejected("Server is at capacity", 1)
+            self._waiters += 1
+        try:
+            deadline = time.monotonic() + self._max_wait
+            while time.monotonic() < deadline:
+                time.sleep(self._poll_interval)
+                token = self._store.acquire_slot(self._max_in_flight, self._slot_lease, time.time())
+                if token is not None:
+                    return token
+        finally:
+            with self._lock:
+                self._waiters -= 1
+        raise Rejected("Server is at capacity", 1)
+
+    def release(self, token):
+        if token is not None:
+            self._store.release_slot(token)
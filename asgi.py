@@ -0,0 +1,497 @@
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
+from starlette.routing import Route
+import asyncio
+import time
+import providers
+from contextlib import asynccontextmanager
+from app import (
+    MODEL_MAPPING,
+    ALL_KEYS_FAILED,
+    DEADLINE_EXCEEDED,
+    timeouts_for,
+    key_pool,
+    context_budget,
+    prompt_registry,
+    response_cache,
+    build_messages,
+    asks_for_system_prompt,
+    image_backend_model,
+    image_metric_model,
+    image_cache,
+    image_jobs,
+    cached_image_url,
+    IMAGE_PARAMS,
+    IMAGE_TIMEOUT,
+    replay_chunks,
+    semantic_lookup,
+    remember,
+    delta_batcher,
+    usage_dict,
+    record_cache_usage,
+    completion_body,
+    models,
+    MODELS_CACHE_CONTROL,
+    router,
+    routed,
+    route_keys,
+    create_completion,
+    validator,
+    admission,
+    consumer_id,
+    journal_chat,
+    warm_up,
+)
+from admission import Rejected
+from image_cache import image_key, sniff_mimetype
+from image_jobs import JobQueueFull, InvalidCallback
+from context import ContextTooLarge
+from sse import sse_chunk
+from response_cache import cache_key
+from model_registry import etag_matches
+from upstream import DeadlineExceeded, EmptyCompletion, UpstreamTimeout
+from validation import InvalidRequest
+from tokens import estimate_tokens_for_chars
+from metrics import (
+    ChatMetrics, CACHE_LOOKUPS, IN_FLIGHT, REQUESTS, CONTEXT_TRIMMED_TOKENS, CONTEXT_REJECTED,
+    render as render_metrics,
+)
+import json
+
+# Async serving mode: each upstream stream is a coroutine rather than a worker
+# thread, so one process can hold thousands of concurrent SSE responses.
+# Run with e.g. `uvicorn asgi:app`; `gunicorn app:app` remains the sync fallback.
+#
+# Requests are counted, timed and journaled as in app.py, and /metrics
+# exports the same series; upstream calls here are not hedged, scheduled or
+# coalesced, so those series stay empty.
+#
+# Admission control (ADMISSION_ENABLED) applies here as in app.py. Its store
+# and slot wait block, so those calls run on the default thread pool, as do
+# slot releases and image job submits and waits; the jobs themselves run on
+# app.py's pools.
+
+client_factory = providers.async_client
+
+async def timed(stream, timeouts, deadline, tick_at=None):
+    # Async counterpart of upstream.py's attempt timeouts: connect until the
+    # first chunk, first_token until content, then idle between chunks.
+    # tick_at() works as in upstream.follow: None is yielded at that time if
+    # no chunk came first. The pending read survives a tick, so the upstream
+    # stream isn't interrupted.
+    started = last = time.monotonic()
+    iterator = stream.__aiter__()
+    connected = content = False
+    pending = None
+    try:
+        while True:
+            if not connected:
+                limit = started + timeouts.connect if timeouts.connect else None
+            elif not content:
+                limit = started + timeouts.first_token if timeouts.first_token else None
+            else:
+                limit = last + timeouts.idle if timeouts.idle else None
+            tick = tick_at() if tick_at is not None else None
+            limits = [t for t in (limit, deadline, tick) if t is not None]
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            now = time.monotonic()
+            done, _ = await asyncio.wait((pending,), timeout=max(0.0, min(limits) - now) if limits else None)
+            if not done:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise DeadlineExceeded("Request deadline exceeded")
+                if limit is not None and now >= limit:
+                    raise UpstreamTimeout("upstream timed out")
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                return
+            last = time.monotonic()
+            connected = True
+            if getattr(chunk.choices[0].delta, "content", None):
+                content = True
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+def rejection(e):
+    return JSONResponse({"error": e.reason}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+
+def release_slot(slot):
+    # Handed to the thread pool but not awaited, so the release still happens
+    # when the request is being cancelled
+    asyncio.get_running_loop().run_in_executor(None, admission.release, slot)
+
+class HoldingSlot:
+    # Wraps a response so the in-flight slot is released once it has been
+    # sent or abandoned, even if the client left before its body was iterated
+    def __init__(self, response, slot):
+        self.response = response
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            release_slot(self.slot)
+
+async def request_body(request):
+    # The raw body, refused from its declared length or as soon as reading passes the limit
+    length = request.headers.get("content-length")
+    validator.check_size(int(length) if length and length.isdigit() else None)
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        chunks.append(chunk)
+        size += len(chunk)
+        validator.check_size(size)
+    return b"".join(chunks)
+
+async def chat_completions(request):
+    started = time.monotonic()
+
+    # Validate request
+    try:
+        data = validator.chat(await request_body(request))
+    except InvalidRequest as e:
+        REQUESTS.labels("chat", "", "bad_request" if e.status == 400 else "too_large").inc()
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+
+    frontend_model = data['model']
+    user_messages = data['messages']
+
+    # Validate model
+    if frontend_model not in MODEL_MAPPING:
+        REQUESTS.labels("chat", "", "bad_request").inc()
+        return JSONResponse({"error": "Invalid model specified"}, status_code=400)
+
+    backend_model = MODEL_MAPPING[frontend_model]
+    observed = ChatMetrics(
+        "chat", frontend_model, backend_model, journal_chat(user_messages, data.get('stream') is not False), started
+    )
+
+    # Rate-limit per consumer and per model
+    if admission is not None:
+        consumer = consumer_id(request.headers, request.client.host if request.client else None)
+        try:
+            await asyncio.to_thread(admission.admit, consumer, frontend_model)
+        except Rejected as e:
+            observed.request("rejected")
+            return rejection(e)
+    observed.phase("validation")
+
+    if asks_for_system_prompt(user_messages):
+        observed.request("system_prompt")
+        return PlainTextResponse(prompt_registry.text(frontend_model))
+
+    # Fit long histories into the backend's context window
+    try:
+        user_messages, trimmed_tokens = context_budget.fit(
+            backend_model, prompt_registry.get(frontend_model).token_count, user_messages
+        )
+    except ContextTooLarge as e:
+        CONTEXT_REJECTED.labels(frontend_model).inc()
+        observed.request("context_too_large")
+        return JSONResponse({"error": str(e)}, status_code=400)
+    headers = None
+    if trimmed_tokens:
+        CONTEXT_TRIMMED_TOKENS.labels(frontend_model, context_budget.strategy).inc(trimmed_tokens)
+        headers = {"X-Context-Trimmed-Tokens": str(trimmed_tokens)}
+
+    messages = build_messages(frontend_model, user_messages)
+    observed.phase("prompt_assembly")
+
+    # Streaming unless the client explicitly asks for a single JSON body
+    stream = data.get('stream') is not False
+
+    # Replay identical requests from the response cache, then close
+    # rephrasings of a recent question from the near-duplicate cache
+    cache_id = None
+    cached = None
+    if response_cache is not None:
+        cache_id = cache_key(frontend_model, user_messages, data)
+        cached = response_cache.get(cache_id)
+        CACHE_LOOKUPS.labels("response", "miss" if cached is None else "hit").inc()
+    probe = None
+    if cached is None:
+        probe, match = semantic_lookup(frontend_model, user_messages, data)
+        if match is not None:
+            cached = match.chunks
+            headers = dict(headers or {}, **{"X-Semantic-Cache-Similarity": f"{match.similarity:.3f}"})
+            observed.request("semantic_hit")
+    else:
+        observed.request("cache_hit")
+    if cached is not None:
+        if not stream:
+            content = "".join(c for c in cached if c)
+            return compact_json(completion_body(frontend_model, content, usage_dict(None, frontend_model, messages[1:], content)), headers=headers)
+        return StreamingResponse(replay_chunks(cached), media_type='text/event-stream', headers=headers)
+
+    # Cap concurrent upstream calls; wait briefly for a slot, then reject
+    slot = None
+    if admission is not None:
+        try:
+            slot = await asyncio.to_thread(admission.acquire)
+        except Rejected as e:
+            observed.request("rejected")
+            return rejection(e)
+
+    if not stream:
+        try:
+            return await complete_chat(frontend_model, messages, cache_id, headers, observed, probe)
+        finally:
+            if slot is not None:
+                release_slot(slot)
+
+    timeouts = timeouts_for(frontend_model)
+    deadline = timeouts.deadline(started)
+
+    output_chars = 0
+    outcome = "cancelled"
+
+    async def generate():
+        nonlocal outcome
+        IN_FLIGHT.inc()
+        try:
+            async for frame in attempts():
+                yield frame
+            if outcome != "ok":
+                outcome = "all_keys_failed"
+        except DeadlineExceeded:
+            outcome = "deadline"
+            yield sse_chunk(DEADLINE_EXCEEDED, "error")
+        finally:
+            IN_FLIGHT.dec()
+            observed.finish(outcome, estimate_tokens_for_chars(output_chars))
+
+    async def attempts():
+        nonlocal output_chars, outcome
+        for route, last in routed(frontend_model):
+            observed.backend = route.backend
+            route_started = time.monotonic()
+            served = False
+            client = client_factory()
+            for api_key in route_keys(route, last):
+                if api_key:
+                    key_pool.mark_used(api_key)
+                observed.attempt_started(api_key)
+                recorded = []
+                batcher = delta_batcher()
+                usage = None
+                try:
+                    response = create_completion(client, route, frontend_model, messages, api_key, stream=True)
+                    async for chunk in timed(response, timeouts, deadline, batcher.flush_at):
+                        if chunk is None:
+                            # Flush interval passed with no new delta
+                            frame = batcher.flush()
+                            if frame:
+                                yield frame
+                            continue
+                        usage = getattr(chunk, "usage", None) or usage
+                        content = getattr(chunk.choices[0].delta, "content", None)
+                        if not content:
+                            continue
+                        if not recorded:
+                            observed.attempt_finished(api_key, "ok")
+                            observed.first_token()
+                        if not served:
+                            router.observe(frontend_model, route, time.monotonic() - route_started)
+                            served = True
+                        recorded.append(content)
+                        output_chars += len(content)
+                        frame = batcher.add(content)
+                        if frame:
+                            yield frame
+                    if not recorded:
+                        raise EmptyCompletion("upstream returned no content")
+                    frame = batcher.flush()
+                    if frame:
+                        yield frame
+                    if api_key:
+                        key_pool.report_success(api_key)
+                    record_cache_usage(frontend_model, route.backend, usage)
+                    remember(cache_id, probe, recorded)
+                    outcome = "ok"
+                    return  # Stop after successful response
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if api_key:
+                        key_pool.report_failure(api_key, e)
+                    observed.attempt_finished(api_key, "stream_error" if recorded else "error")
+                    frame = batcher.flush()
+                    if frame:
+                        yield frame
+                    continue  # Try next API key
+            if not served:
+                router.observe(frontend_model, route, ok=False)
+        # If all keys fail, yield an error message
+        yield sse_chunk(ALL_KEYS_FAILED, "error")
+    response = StreamingResponse(generate(), media_type='text/event-stream', headers=headers)
+    return response if slot is None else HoldingSlot(response, slot)
+
+async def complete_chat(frontend_model, messages, cache_id, headers, observed, probe=None):
+    # Non-streaming path with the same route and key failover as generate()
+    deadline = timeouts_for(frontend_model).deadline(observed.started)
+    for route, last in routed(frontend_model):
+        observed.backend = route.backend
+        route_started = time.monotonic()
+        client = client_factory()
+        for api_key in route_keys(route, last):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                observed.finish("deadline")
+                return compact_json({"error": "Request deadline exceeded"}, 504)
+            if api_key:
+                key_pool.mark_used(api_key)
+            observed.attempt_started(api_key)
+            try:
+                response = await asyncio.wait_for(
+                    create_completion(client, route, frontend_model, messages, api_key, stream=False), remaining
+                )
+                content = response.choices[0].message.content
+                if not content:
+                    raise EmptyCompletion("upstream returned no content")
+            except Exception as e:
+                if api_key:
+                    key_pool.report_failure(api_key, e)
+                observed.attempt_finished(api_key, "error")
+                continue  # Try next API key
+            if api_key:
+                key_pool.report_success(api_key)
+            observed.attempt_finished(api_key, "ok")
+            router.observe(frontend_model, route, time.monotonic() - route_started)
+            usage = getattr(response, "usage", None)
+            record_cache_usage(frontend_model, route.backend, usage)
+            remember(cache_id, probe, [content])
+            body = completion_body(frontend_model, content, usage_dict(usage, frontend_model, messages[1:], content))
+            observed.finish("ok", body["usage"].get("completion_tokens") or 0)
+            return compact_json(body, headers=headers)
+        router.observe(frontend_model, route, ok=False)
+    observed.finish("all_keys_failed")
+    return compact_json({"error": "All API keys failed."}, 502)
+
+def compact_json(body, status=200, headers=None):
+    return Response(json.dumps(body, separators=(",", ":")), status_code=status, media_type='application/json', headers=headers)
+
+async def image_generation(request):
+    try:
+        data = validator.image(await request_body(request))
+    except InvalidRequest as e:
+        REQUESTS.labels("images", "", "bad_request" if e.status == 400 else "too_large").inc()
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+    frontend_model = data.get('model', 'botintel-image')
+    prompt = data.get('prompt')
+    if not prompt:
+        REQUESTS.labels("images", "", "bad_request").inc()
+        return JSONResponse({"error": "Missing 'prompt' parameter"}, status_code=400)
+
+    backend_model = image_backend_model(frontend_model)
+    if backend_model is None:
+        REQUESTS.labels("images", "", "bad_request").inc()
+        return JSONResponse({"error": f"Unknown image model: {frontend_model}"}, status_code=400)
+
+    params = {name: data[name] for name in IMAGE_PARAMS if name in data}
+
+    if admission is not None:
+        consumer = consumer_id(request.headers, request.client.host if request.client else None)
+        try:
+            await asyncio.to_thread(admission.admit, consumer, backend_model)
+        except Rejected as e:
+            REQUESTS.labels("images", image_metric_model(backend_model), "rejected").inc()
+            return rejection(e)
+
+    # Repeats of a cached prompt skip generation entirely
+    if image_cache is not None:
+        entry = await asyncio.to_thread(image_cache.get, image_key(backend_model, prompt, params))
+        CACHE_LOOKUPS.labels("image", "miss" if entry is None else "hit").inc()
+        if entry is not None:
+            return JSONResponse({"url": absolute_url(request, cached_image_url(entry))})
+
+    callback_url = data.get('callback_url')
+    try:
+        job = await asyncio.to_thread(
+            image_jobs.submit, backend_model, prompt, params, callback_url, str(request.base_url)
+        )
+    except InvalidCallback as e:
+        REQUESTS.labels("images", image_metric_model(backend_model), "bad_request").inc()
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except JobQueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={'Retry-After': '5'})
+
+    # Async mode: hand back the job id right away
+    if data.get('async') or callback_url:
+        return JSONResponse(job, status_code=202, headers={'Location': f"/v1/images/jobs/{job['id']}"})
+
+    job = await asyncio.to_thread(image_jobs.wait, job["id"], IMAGE_TIMEOUT)
+    if job["status"] == "succeeded":
+        return JSONResponse({"url": absolute_url(request, job["url"])})
+    if job["status"] == "failed":
+        return JSONResponse({"error": job["error"]}, status_code=502)
+    # Still running; the client can keep polling the job
+    return JSONResponse(dict(job, error="Image generation timed out"), status_code=504)
+
+async def image_job(request):
+    job = image_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Unknown or expired job"}, status_code=404)
+    return JSONResponse(dict(job, url=absolute_url(request, job["url"])))
+
+async def image_blob(request):
+    digest = request.path_params['digest']
+    path = image_cache.blob_path(digest) if image_cache is not None else None
+    if path is None:
+        return JSONResponse({"error": "Unknown image"}, status_code=404)
+    headers = {'ETag': f'"{digest}"', 'Cache-Control': 'public, max-age=31536000'}
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    with open(path, 'rb') as f:
+        mimetype = sniff_mimetype(f.read(16))
+    return FileResponse(path, media_type=mimetype, headers=headers)
+
+async def metrics(request):
+    body, content_type = render_metrics()
+    return Response(body, headers={'Content-Type': content_type})
+
+def absolute_url(request, url):
+    if url and url.startswith("/"):
+        return str(request.base_url).rstrip("/") + url
+    return url
+
+def catalogue_response(request, rendered):
+    payload, etag = rendered
+    headers = {'ETag': etag, 'Cache-Control': MODELS_CACHE_CONTROL}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload, media_type='application/json', headers=headers)
+
+async def list_models(request):
+    return catalogue_response(request, models.list_body())
+
+async def get_model(request):
+    model_id = request.path_params['model_id']
+    rendered = models.model_body(model_id)
+    if rendered is None:
+        return JSONResponse({"error": f"Unknown model: {model_id}"}, status_code=404)
+    return catalogue_response(request, rendered)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load g4f before serving, so the first request doesn't pay for it
+    providers.preload([], clients=("AsyncClient",))
+    warm_up()
+    yield
+
+app = Starlette(lifespan=lifespan, routes=[
+    Route('/v1/chat/completions', chat_completions, methods=['POST']),
+    Route('/v1/images/generations', image_generation, methods=['POST']),
+    Route('/v1/images/jobs/{job_id}', image_job, methods=['GET']),
+    Route('/v1/images/blobs/{digest}', image_blob, methods=['GET']),
+    Route('/v1/models', list_models, methods=['GET']),
+    Route('/v1/models/{model_id:path}', get_model, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+])
@@ -0,0 +1,78 @@
+# Microbenchmark: per-delta SSE encoding as generate() used to do it (a fresh
+# nested dict and json.dumps per token) against sse.py's pre-rendered frame,
+# with and without delta batching.
+#
+#   python benchmarks/bench_sse.py [--deltas N] [--repeat R]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse import sse_delta, DeltaBatcher
+
+
+def legacy(deltas):
+    for content in deltas:
+        data = {
+            "choices": [
+                {
+                    "delta": {"content": content},
+                    "index": 0,
+                    "finish_reason": None
+                }
+            ]
+        }
+        yield f"data: {json.dumps(data)}\n\n"
+
+
+def prerendered(deltas):
+    for content in deltas:
+        if content:
+            yield sse_delta(content)
+
+
+def batched(deltas, flush_bytes):
+    batcher = DeltaBatcher(0.0, flush_bytes)
+    for content in deltas:
+        frame = batcher.add(content)
+        if frame:
+            yield frame
+    frame = batcher.flush()
+    if frame:
+        yield frame
+
+
+def make_deltas(n):
+    words = ["The", " quick", " brown", " fox", " \"jumps\"", " over", "\n", " the", " lazy", " dög", ""]
+    return [words[i % len(words)] for i in range(n)]
+
+
+def run(name, fn, deltas, repeat):
+    best = float("inf")
+    frames = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = sum(1 for _ in fn(deltas))
+        best = min(best, time.perf_counter() - start)
+    per_delta = best / len(deltas) * 1e9
+    print(f"{name:<22} {best * 1000:8.2f} ms  {per_delta:7.1f} ns/delta  {frames:7d} frames")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deltas", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    deltas = make_deltas(args.deltas)
+    run("legacy json.dumps", legacy, deltas, args.repeat)
+    run("pre-rendered", prerendered, deltas, args.repeat)
+    run("batched 512 bytes", lambda d: batched(d, 512), deltas, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Startup benchmark: imports app.py in fresh interpreters and reports how long
+# the import takes (what a worker pays before it can serve) and how long until
+# warm_up() has loaded the g4f providers (what a preloading master pays). With
+# --max-import-ms / --max-ready-ms it exits non-zero when the median is over
+# budget, so it can guard against regressions such as a top-level g4f import.
+#
+#   python benchmarks/bench_startup.py [--runs 7] [--max-import-ms 250]
+#       [--max-ready-ms 1500] [--top 10]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.warm_up()
+ready = time.perf_counter()
+print(imported - started, ready - started)
+"""
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[-2]), float(output[-1])
+
+
+def slowest_imports(top):
+    # Cumulative self+children time per module from -X importtime
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-ready-ms", type=float, default=None)
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest imports (0 to skip)")
+    args = parser.parse_args()
+
+    run_once()  # Warm the filesystem cache and .pyc files
+    imports, readies = [], []
+    for _ in range(args.runs):
+        imported, ready = run_once()
+        imports.append(imported * 1000)
+        readies.append(ready * 1000)
+
+    import_ms = statistics.median(imports)
+    ready_ms = statistics.median(readies)
+    print(f"import app  median {import_ms:8.1f}ms  min {min(imports):8.1f}ms  ({args.runs} runs)")
+    print(f"ready       median {ready_ms:8.1f}ms  min {min(readies):8.1f}ms")
+
+    if args.top:
+        print("\nslowest imports (cumulative):")
+        for micros, name in slowest_imports(args.top):
+            print(f"  {micros / 1000:8.1f}ms  {name}")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\nimport time {import_ms:.1f}ms is over the {args.max_import_ms:g}ms budget")
+        failed = True
+    if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+        print(f"\nready time {ready_ms:.1f}ms is over the {args.max_ready_ms:g}ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# Closed-loop load generator for the chat and image routes. Each of
+# --concurrency workers sends requests back to back for --duration seconds,
+# picking streaming chats, non-streaming chats and image generations in the
+# proportions given by --mix. Reports p50/p95/p99 time to first token and
+# total latency per kind, throughput, failures, and how saturated the server
+# was (upstream streams in flight, sampled from /metrics and, against
+# benchmarks/mock_provider.py, /_mock/stats).
+#
+#   python benchmarks/load.py [--url http://127.0.0.1:5001] [--concurrency 16]
+#       [--duration 30] [--mix stream=8,complete=1,image=1] [--json]
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from urllib.parse import urlsplit
+
+KINDS = ("stream", "complete", "image")
+
+
+class Result:
+    __slots__ = ("kind", "ok", "status", "ttft", "latency", "tokens")
+
+    def __init__(self, kind, ok, status, ttft, latency, tokens):
+        self.kind = kind
+        self.ok = ok
+        self.status = status
+        self.ttft = ttft
+        self.latency = latency
+        self.tokens = tokens
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        if part.strip():
+            kind, weight = part.split("=")
+            if kind.strip() not in KINDS:
+                raise SystemExit(f"Unknown request kind in --mix: {kind}")
+            mix[kind.strip()] = float(weight)
+    return mix
+
+
+class Target:
+    def __init__(self, url, model, image_model, prompt_words, unique, timeout):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.base = url.rstrip("/")
+        self.model = model
+        self.image_model = image_model
+        self.prompt_words = prompt_words
+        self.unique = unique
+        self.timeout = timeout
+
+    def connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def prompt(self):
+        # Unique prompts by default so the response cache and coalescing
+        # don't flatter the numbers
+        words = " ".join(["benchmark"] * self.prompt_words)
+        return f"{words} {uuid.uuid4().hex}" if self.unique else words
+
+
+def post(conn, path, body):
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    return conn.getresponse()
+
+
+def run_stream(target, conn):
+    started = time.monotonic()
+    response = post(conn, "/v1/chat/completions", {
+        "model": target.model,
+        "messages": [{"role": "user", "content": target.prompt()}],
+    })
+    return read_stream(response, started)
+
+
+def read_stream(response, started):
+    ttft = None
+    chars = 0
+    ok = response.status == 200
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        if not line.startswith(b"data: "):
+            continue
+        try:
+            choice = json.loads(line[6:])["choices"][0]
+        except (ValueError, KeyError, IndexError):
+            continue
+        if choice.get("finish_reason") == "error":
+            ok = False
+        elif choice.get("delta", {}).get("content"):
+            if ttft is None:
+                ttft = time.monotonic() - started
+            chars += len(choice["delta"]["content"])
+    # Frames may be batched, so count characters and estimate tokens like tokens.py
+    return Result("stream", ok, response.status, ttft, time.monotonic() - started, chars / 4)
+
+
+def run_complete(target, conn):
+    started = time.monotonic()
+    response = post(conn, "/v1/chat/completions", {
+        "model": target.model,
+        "stream": False,
+        "messages": [{"role": "user", "content": target.prompt()}],
+    })
+    body = response.read()
+    latency = time.monotonic() - started
+    tokens = 0
+    if response.status == 200:
+        try:
+            tokens = json.loads(body).get("usage", {}).get("completion_tokens") or 0
+        except ValueError:
+            pass
+    return Result("complete", response.status == 200, response.status, latency, latency, tokens)
+
+
+def run_image(target, conn):
+    started = time.monotonic()
+    response = post(conn, "/v1/images/generations", {"model": target.image_model, "prompt": target.prompt()})
+    response.read()
+    latency = time.monotonic() - started
+    return Result("image", response.status == 200, response.status, latency, latency, 0)
+
+
+RUNNERS = {"stream": run_stream, "complete": run_complete, "image": run_image}
+
+
+def worker(target, mix, deadline, results, lock):
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    conn = target.connect()
+    while time.monotonic() < deadline:
+        kind = random.choices(kinds, weights)[0]
+        started = time.monotonic()
+        try:
+            result = RUNNERS[kind](target, conn)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = target.connect()
+            result = Result(kind, False, None, None, time.monotonic() - started, 0)
+        with lock:
+            results.append(result)
+    conn.close()
+
+
+def fetch(url, timeout=2.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read().decode("utf-8")
+    except Exception:
+        return None
+
+
+def in_flight_streams(metrics_text):
+    for line in metrics_text.splitlines():
+        if line.startswith("answer_api_in_flight_streams"):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def sampler(target, stop, samples, interval):
+    # Polls server-side concurrency while the load runs
+    while not stop.wait(interval):
+        sample = {}
+        text = fetch(target.base + "/metrics")
+        if text:
+            sample["streams"] = in_flight_streams(text)
+        mock = fetch(target.base + "/_mock/stats")
+        if mock:
+            sample["upstream"] = json.loads(mock)["in_flight"]
+        samples.append(sample)
+
+
+def summarise(results, elapsed, concurrency, samples):
+    report = {"elapsed": round(elapsed, 2), "concurrency": concurrency, "kinds": {}}
+    for kind in KINDS:
+        rows = [r for r in results if r.kind == kind]
+        if not rows:
+            continue
+        ok = [r for r in rows if r.ok]
+        ttfts = [r.ttft for r in ok if r.ttft is not None]
+        latencies = [r.latency for r in ok]
+        statuses = {}
+        for r in rows:
+            if not r.ok:
+                statuses[str(r.status)] = statuses.get(str(r.status), 0) + 1
+        report["kinds"][kind] = {
+            "requests": len(rows),
+            "failed": len(rows) - len(ok),
+            "failures_by_status": statuses,
+            "rps": round(len(ok) / elapsed, 2),
+            "tokens_per_second": round(sum(r.tokens for r in ok) / elapsed, 1),
+            "ttft": {f"p{int(q * 100)}": percentile(ttfts, q) for q in (0.5, 0.95, 0.99)},
+            "latency": {f"p{int(q * 100)}": percentile(latencies, q) for q in (0.5, 0.95, 0.99)},
+        }
+    for name in ("streams", "upstream"):
+        values = [s[name] for s in samples if s.get(name) is not None]
+        if values:
+            mean = sum(values) / len(values)
+            report[f"in_flight_{name}"] = {
+                "mean": round(mean, 2),
+                "peak": max(values),
+                "saturation": round(mean / concurrency, 3),
+            }
+    return report
+
+
+def fmt(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:8.1f}ms"
+
+
+def print_report(report):
+    print(f"{report['elapsed']}s at concurrency {report['concurrency']}")
+    print(f"{'kind':<9} {'reqs':>6} {'fail':>5} {'rps':>8} {'tok/s':>8}"
+          f" {'ttft p50':>10} {'p95':>10} {'p99':>10} {'total p50':>10} {'p95':>10} {'p99':>10}")
+    for kind, row in report["kinds"].items():
+        ttft, latency = row["ttft"], row["latency"]
+        print(f"{kind:<9} {row['requests']:>6} {row['failed']:>5} {row['rps']:>8} {row['tokens_per_second']:>8}"
+              f" {fmt(ttft['p50']):>10} {fmt(ttft['p95']):>10} {fmt(ttft['p99']):>10}"
+              f" {fmt(latency['p50']):>10} {fmt(latency['p95']):>10} {fmt(latency['p99']):>10}")
+        if row["failures_by_status"]:
+            print(f"{'':<9} failures by status: {row['failures_by_status']}")
+    for name in ("streams", "upstream"):
+        stats = report.get(f"in_flight_{name}")
+        if stats:
+            print(f"in-flight {name}: mean {stats['mean']}, peak {stats['peak']}, saturation {stats['saturation']:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default="stream=8,complete=1,image=1")
+    parser.add_argument("--model", default="botintel-v4")
+    parser.add_argument("--image-model", default="botintel-image")
+    parser.add_argument("--prompt-words", type=int, default=20)
+    parser.add_argument("--repeat-prompts", action="store_true", help="send identical prompts (exercises caching)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    target = Target(args.url, args.model, args.image_model, args.prompt_words, not args.repeat_prompts, args.timeout)
+    mix = parse_mix(args.mix)
+    results = []
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    sampling = threading.Thread(target=sampler, args=(target, stop, samples, args.sample_interval), daemon=True)
+    sampling.start()
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    workers = [
+        threading.Thread(target=worker, args=(target, mix, deadline, results, lock))
+        for _ in range(args.concurrency)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.monotonic() - started
+    stop.set()
+    sampling.join()
+
+    report = summarise(results, elapsed, args.concurrency, samples)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
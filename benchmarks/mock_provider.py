@@ -0,0 +1,199 @@
+# Local stand-in for the g4f client so the service can be load-tested without
+# touching PuterJS or spending real keys. MockClient mimics the parts of
+# g4f.client.Client the app calls: chat.completions.create (streaming and
+# not) and images.generate. Timing and failures are set by MockConfig:
+# time to first token, tokens per second, and keys (by index in
+# app.api_keys_list) that always answer 429 or 401.
+#
+#   python benchmarks/mock_provider.py [--port 5001] [--ttft-ms 300] [--tps 60]
+#       [--tokens 200] [--rate-limited 0,1] [--unauthorized 2]
+#
+# Serves app.py on the mock provider; drive it with benchmarks/load.py.
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import types
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MockConfig:
+    def __init__(self, ttft=0.3, tps=60.0, tokens=200, image_seconds=2.0, jitter=0.2,
+                 rate_limited_keys=(), unauthorized_keys=(), error_rate=0.0):
+        self.ttft = ttft
+        self.tps = tps
+        self.tokens = tokens
+        self.image_seconds = image_seconds
+        self.jitter = jitter
+        self.rate_limited_keys = set(rate_limited_keys)
+        self.unauthorized_keys = set(unauthorized_keys)
+        self.error_rate = error_rate
+
+
+class MockError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+class MockStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.failures = 0
+
+    def enter(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.failures += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+def chunk(content):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+
+class MockCompletions:
+    def __init__(self, config, stats):
+        self._config = config
+        self._stats = stats
+
+    def _jittered(self, seconds):
+        spread = self._config.jitter
+        return max(0.0, seconds * random.uniform(1 - spread, 1 + spread))
+
+    def _check_key(self, api_key):
+        if api_key in self._config.rate_limited_keys:
+            raise MockError(429, "Too Many Requests")
+        if api_key in self._config.unauthorized_keys:
+            raise MockError(401, "Unauthorized")
+        if self._config.error_rate and random.random() < self._config.error_rate:
+            raise MockError(502, "Bad Gateway")
+
+    def create(self, model, messages, api_key=None, stream=False, **kwargs):
+        self._stats.enter()
+        try:
+            self._check_key(api_key)
+        except MockError:
+            self._stats.leave(failed=True)
+            raise
+        if stream:
+            return self._stream()
+        try:
+            time.sleep(self._jittered(self._config.ttft + self._config.tokens / self._config.tps))
+            content = " ".join(["tok"] * self._config.tokens)
+            usage = types.SimpleNamespace(
+                prompt_tokens=sum(len(str(m.get("content", ""))) // 4 for m in messages),
+                completion_tokens=self._config.tokens,
+                total_tokens=None,
+            )
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))], usage=usage
+            )
+        finally:
+            self._stats.leave()
+
+    def _stream(self):
+        try:
+            time.sleep(self._jittered(self._config.ttft))
+            interval = 1.0 / self._config.tps
+            for i in range(self._config.tokens):
+                if i:
+                    time.sleep(interval)
+                yield chunk("tok ")
+        finally:
+            self._stats.leave()
+
+
+class MockImages:
+    def __init__(self, config, stats):
+        self._config = config
+        self._stats = stats
+
+    def generate(self, model, prompt, **kwargs):
+        self._stats.enter()
+        try:
+            time.sleep(self._config.image_seconds)
+            url = f"https://mock.invalid/images/{uuid.uuid4().hex}.png"
+            return types.SimpleNamespace(data=[types.SimpleNamespace(url=url)])
+        finally:
+            self._stats.leave()
+
+
+class MockClient:
+    def __init__(self, config, stats):
+        self.chat = types.SimpleNamespace(completions=MockCompletions(config, stats))
+        self.images = MockImages(config, stats)
+
+
+def install(app_module, config, stats=None):
+    # Make the app build mock clients instead of g4f ones
+    stats = stats or MockStats()
+    app_module.client_factory = lambda: MockClient(config, stats)
+    return stats
+
+
+def parse_indexes(value):
+    return [int(i) for i in value.split(",") if i.strip()] if value else []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tps", type=float, default=60)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--image-ms", type=float, default=2000)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limited", default="", help="key indexes that always answer 429")
+    parser.add_argument("--unauthorized", default="", help="key indexes that always answer 401")
+    args = parser.parse_args()
+
+    import app
+
+    keys = app.api_keys_list
+    config = MockConfig(
+        ttft=args.ttft_ms / 1000,
+        tps=args.tps,
+        tokens=args.tokens,
+        image_seconds=args.image_ms / 1000,
+        jitter=args.jitter,
+        rate_limited_keys=[keys[i] for i in parse_indexes(args.rate_limited)],
+        unauthorized_keys=[keys[i] for i in parse_indexes(args.unauthorized)],
+        error_rate=args.error_rate,
+    )
+    stats = install(app, config)
+
+    @app.app.route("/_mock/stats", methods=["GET"])
+    def mock_stats():
+        return app.jsonify(dict(stats.snapshot(), keys=app.key_pool.snapshot()))
+
+    app.app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
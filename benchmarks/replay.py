@@ -0,0 +1,167 @@
+# Replays a request journal (JOURNAL_PATH, see journal.py) against a running
+# server, for capacity planning with real traffic shapes. Requests are sent
+# open-loop at their recorded arrival times, divided by --speed (2 replays
+# twice as fast, 0 sends them back to back), with at most --concurrency in
+# flight. Point it at benchmarks/mock_provider.py to size the service without
+# spending real keys.
+#
+# Journals written without content get filler messages of the recorded roles
+# and sizes, unique per request so caching and coalescing don't flatter the
+# numbers. Reports the same table as benchmarks/load.py, the recorded
+# TTFT/latency next to the replayed ones, and how far dispatch fell behind
+# the schedule (a sign the client, not the server, was the bottleneck).
+#
+#   python benchmarks/replay.py journal.jsonl.1 journal.jsonl
+#       [--url http://127.0.0.1:5001] [--speed 1] [--concurrency 64]
+#       [--limit N] [--routes chat,images] [--json]
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+from load import Result, Target, fmt, percentile, post, print_report, read_stream, sampler, summarise
+
+
+def filler(chars, tag):
+    # `chars` characters of text starting with a per-request tag
+    text = f"{tag} " + "benchmark " * (chars // 10 + 1)
+    return text[:max(chars, len(tag))]
+
+
+def request_body(record, tag):
+    if record["route"] == "images":
+        prompt = (record.get("content") or [{}])[0].get("content") or filler(record.get("prompt_chars", 40), tag)
+        return "/v1/images/generations", dict(record.get("params") or {}, model=record["model"], prompt=prompt)
+    messages = record.get("content") or [
+        {"role": role, "content": filler(chars, tag)} for role, chars in record.get("messages") or [["user", 40]]
+    ]
+    return "/v1/chat/completions", {"model": record["model"], "stream": record.get("stream", True), "messages": messages}
+
+
+def kind_of(record):
+    if record["route"] == "images":
+        return "image"
+    return "stream" if record.get("stream", True) else "complete"
+
+
+def send(target, local, record, tag):
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = local.conn = target.connect()
+    kind = kind_of(record)
+    path, body = request_body(record, tag)
+    started = time.monotonic()
+    try:
+        response = post(conn, path, body)
+        if kind == "stream":
+            return read_stream(response, started)
+        response.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        local.conn = None
+        return Result(kind, False, None, None, time.monotonic() - started, 0)
+    latency = time.monotonic() - started
+    ok = response.status in (200, 202)
+    return Result(kind, ok, response.status, latency, latency, 0)
+
+
+def load_records(paths, routes, limit):
+    records = [r for r in journal.read(paths) if r.get("route") in routes and "ts" in r and "model" in r]
+    # Files from several workers interleave; replay in arrival order
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+def recorded_summary(records):
+    summary = {}
+    for kind in ("stream", "complete", "image"):
+        rows = [r for r in records if kind_of(r) == kind and r.get("outcome") == "ok"]
+        if not rows:
+            continue
+        ttfts = [r["ttft"] for r in rows if r.get("ttft") is not None]
+        durations = [r["duration"] for r in rows if r.get("duration") is not None]
+        summary[kind] = {
+            "requests": len(rows),
+            "ttft": {f"p{int(q * 100)}": percentile(ttfts, q) for q in (0.5, 0.95)},
+            "latency": {f"p{int(q * 100)}": percentile(durations, q) for q in (0.5, 0.95)},
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("journals", nargs="+", help="journal files, oldest first")
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 sends back to back")
+    parser.add_argument("--concurrency", type=int, default=64, help="upper bound on requests in flight")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--routes", default="chat,images")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--sample-interval", type=float, default=0.5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    records = load_records(args.journals, set(args.routes.split(",")), args.limit)
+    if not records:
+        raise SystemExit("No replayable records in the given journals")
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"replaying {len(records)} requests recorded over {span:.1f}s at speed {args.speed:g}", file=sys.stderr)
+
+    target = Target(args.url, None, None, 0, True, args.timeout)
+    local = threading.local()
+    results = []
+    lags = []
+    lock = threading.Lock()
+    samples = []
+    stop = threading.Event()
+    sampling = threading.Thread(target=sampler, args=(target, stop, samples, args.sample_interval), daemon=True)
+    sampling.start()
+
+    def run(record, due, tag):
+        lag = time.monotonic() - due
+        result = send(target, local, record, tag)
+        with lock:
+            results.append(result)
+            lags.append(lag)
+
+    run_id = uuid.uuid4().hex[:8]
+    started = time.monotonic()
+    first_ts = records[0]["ts"]
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for i, record in enumerate(records):
+            due = started + ((record["ts"] - first_ts) / args.speed if args.speed > 0 else 0.0)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, record, due, f"replay-{run_id}-{i}")
+    elapsed = time.monotonic() - started
+    stop.set()
+    sampling.join()
+
+    report = summarise(results, elapsed, args.concurrency, samples)
+    report["recorded"] = recorded_summary(records)
+    report["schedule_lag"] = {"p50": percentile(lags, 0.5), "p99": percentile(lags, 0.99), "max": max(lags)}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print_report(report)
+    print("\nrecorded (ok requests):")
+    for kind, row in report["recorded"].items():
+        ttft, latency = row["ttft"], row["latency"]
+        print(f"{kind:<9} {row['requests']:>6}  ttft p50 {fmt(ttft['p50']):>10} p95 {fmt(ttft['p95']):>10}"
+              f"  total p50 {fmt(latency['p50']):>10} p95 {fmt(latency['p95']):>10}")
+    lag = report["schedule_lag"]
+    print(f"\nschedule lag: p50 {fmt(lag['p50'])}, p99 {fmt(lag['p99'])}, max {fmt(lag['max'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from tokens import estimate_message_tokens, estimate_tokens
+
+# Keeps a conversation inside its backend's context window before any
+# upstream call is made. Token counts are the cheap estimates from tokens.py,
+# so limits are applied with a reserve for the completion itself.
+#
+# Strategies:
+#   drop_oldest       drop the oldest turns until the rest fits
+#   keep_pinned       like drop_oldest, but never drop client system messages,
+#                     the first user turn, or messages marked "pinned": true
+#   summarise_middle  keep the first and last turns and replace the middle
+#                     with a short extractive digest (first sentence of each)
+
+STRATEGIES = ("drop_oldest", "keep_pinned", "summarise_middle")
+
+DIGEST_SENTENCE_CHARS = 200
+
+
+class ContextTooLarge(Exception):
+    def __init__(self, needed, limit):
+        super().__init__(f"Conversation needs ~{needed} tokens but the model accepts {limit}")
+        self.needed = needed
+        self.limit = limit
+
+
+class ContextBudget:
+    def __init__(self, limits, default_limit=128000, reserve=4096, strategy="drop_oldest", keep_first=1, keep_last=4):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy: {strategy}")
+        self._limits = dict(limits)
+        self._default_limit = default_limit
+        self._reserve = reserve
+        self.strategy = strategy
+        self._keep_first = keep_first
+        self._keep_last = keep_last
+
+    def limit_for(self, backend):
+        return self._limits.get(backend, self._default_limit) - self._reserve
+
+    def fit(self, backend, system_tokens, user_messages):
+        # Returns (messages, trimmed_tokens). Raises ContextTooLarge when even
+        # the newest turn alone cannot fit, so no key is spent on it.
+        limit = self.limit_for(backend)
+        costs = [estimate_message_tokens((m,)) for m in user_messages]
+        total = system_tokens + sum(costs)
+        if total <= limit:
+            return strip_pins(user_messages), 0
+
+        if self.strategy == "summarise_middle":
+            kept = self._summarise_middle(user_messages, costs, limit - system_tokens)
+        else:
+            kept = self._drop(user_messages, costs, limit - system_tokens, self.strategy == "keep_pinned")
+        kept_tokens = system_tokens + sum(estimate_message_tokens((m,)) for m in kept)
+        if kept_tokens > limit:
+            raise ContextTooLarge(kept_tokens, limit)
+        return strip_pins(kept), total - kept_tokens
+
+    def _drop(self, messages, costs, budget, honour_pins):
+        keep = [False] * len(messages)
+        used = 0
+        if honour_pins:
+            first_user = next((i for i, m in enumerate(messages) if m.get("role") == "user"), None)
+            for i, m in enumerate(messages):
+                if m.get("pinned") or m.get("role") == "system" or i == first_user:
+                    keep[i] = True
+                    used += costs[i]
+        # Fill from the newest turn backwards; the newest is always kept
+        for i in range(len(messages) - 1, -1, -1):
+            if keep[i]:
+                continue
+            if used + costs[i] > budget and i != len(messages) - 1:
+                break
+            keep[i] = True
+            used += costs[i]
+        kept = [m for m, k in zip(messages, keep) if k]
+        # Don't open the trimmed history with a dangling assistant reply
+        while len(kept) > 1 and kept[0].get("role") == "assistant" and not kept[0].get("pinned"):
+            kept.pop(0)
+        return kept
+
+    def _summarise_middle(self, messages, costs, budget):
+        head = messages[:self._keep_first]
+        tail_start = max(len(head), len(messages) - self._keep_last)
+        tail = messages[tail_start:]
+        middle = messages[len(head):tail_start]
+        used = sum(costs[:len(head)]) + sum(costs[tail_start:])
+        if used > budget:
+            # First and last turns alone are too big; fall back to dropping
+            return self._drop(messages, costs, budget, False)
+
+        lines = []
+        remaining = budget - used - estimate_tokens("Summary of earlier conversation:") - 4
+        for m in middle:
+            content = m.get("content")
+            if isinstance(content, list):
+                content = " ".join(p.get("text") or "" for p in content if isinstance(p, dict))
+            if not isinstance(content, str) or not content.strip():
+                continue
+            line = f"- {m.get('role', 'user')}: {first_sentence(content)}"
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                break
+            lines.append(line)
+            remaining -= cost
+        if not lines:
+            return head + tail
+        digest = {"role": "system", "content": "Summary of earlier conversation:\n" + "\n".join(lines)}
+        return head + [digest] + tail
+
+
+def first_sentence(text):
+    text = " ".join(text.split())
+    for i, ch in enumerate(text[:DIGEST_SENTENCE_CHARS]):
+        if ch in ".!?" and (i + 1 == len(text) or text[i + 1] == " "):
+            return text[:i + 1]
+    if len(text) > DIGEST_SENTENCE_CHARS:
+        return text[:DIGEST_SENTENCE_CHARS].rstrip() + "…"
+    return text
+
+
+def strip_pins(messages):
+    # "pinned" is our extension; upstream APIs would reject the extra field
+    if not any("pinned" in m for m in messages):
+        return messages
+    return [{k: v for k, v in m.items() if k != "pinned"} if "pinned" in m else m for m in messages]
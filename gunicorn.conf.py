@@ -0,0 +1,37 @@
+# gunicorn hooks for `gunicorn app:app` (picked up automatically from the
+# working directory).
+#
+# For /metrics to aggregate across workers, export PROMETHEUS_MULTIPROC_DIR
+# pointing at an empty directory before starting gunicorn.
+#
+# The app is preloaded in the master (GUNICORN_PRELOAD=0 turns this off):
+# prompts, the model catalogue and the g4f providers are loaded once, then
+# gc.freeze() moves them out of the collector's view so workers' collections
+# don't write to, and un-share, the pages they inherited copy-on-write.
+
+import gc
+import os
+
+from prometheus_client import multiprocess
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+# The config is read before the app is preloaded: no collections while the
+# master builds what the workers will share
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after preloading, before any worker is forked
+    if preload_app:
+        import app
+
+        app.warm_up()
+        gc.freeze()
+        gc.enable()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import urllib.request
+from collections import OrderedDict
+
+# Cache of generated images keyed on (backend model, normalised prompt,
+# params). Without a blob directory it remembers the upstream URL in memory.
+# With one, the image bytes are downloaded once into a content-addressed
+# store (blobs/<aa>/<sha256>) and repeats are served from local disk; a small
+# key file maps each request key to its blob so every worker and restart
+# shares the cache. Blobs are evicted least-recently-used (by mtime, which
+# hits refresh) once the directory exceeds max_bytes, and key files whose
+# blob is gone are swept with them. on_evict(tier, count), if given, is
+# called with "memory" or "disk" and the number of entries evicted.
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+MAX_IMAGE_BYTES = 32 * 1024 * 1024
+
+MAGIC_TYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def normalise_prompt(prompt):
+    return " ".join(prompt.split()).lower()
+
+
+def image_key(backend_model, prompt, params):
+    canonical = json.dumps(
+        [backend_model, normalise_prompt(prompt), params],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def sniff_mimetype(head):
+    for magic, mimetype in MAGIC_TYPES:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class ImageCache:
+    def __init__(self, blob_dir=None, max_bytes=1024 * 1024 * 1024, max_entries=10000, download_timeout=30.0,
+                 on_evict=None):
+        self._blob_dir = blob_dir
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._download_timeout = download_timeout
+        self._lock = threading.Lock()
+        self._urls = OrderedDict()
+        self._on_evict = on_evict
+        if blob_dir:
+            os.makedirs(os.path.join(blob_dir, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(blob_dir, "keys"), exist_ok=True)
+
+    def get(self, key):
+        # Returns {"url": upstream_url, "digest": blob digest or None} or None
+        if self._blob_dir:
+            entry = self._read_key(key)
+            if entry is not None:
+                if self._touch(entry["digest"]):
+                    return entry
+                try:
+                    os.remove(self._key_path(key))
+                except OSError:
+                    pass
+        else:
+            with self._lock:
+                url = self._urls.get(key)
+                if url is not None:
+                    self._urls.move_to_end(key)
+                    return {"url": url, "digest": None}
+        return None
+
+    def put(self, key, url):
+        if not self._blob_dir:
+            evicted = 0
+            with self._lock:
+                self._urls[key] = url
+                self._urls.move_to_end(key)
+                while len(self._urls) > self._max_entries:
+                    self._urls.popitem(last=False)
+                    evicted += 1
+            if evicted and self._on_evict is not None:
+                self._on_evict("memory", evicted)
+            return {"url": url, "digest": None}
+
+        digest = self._download(url)
+        if digest is None:
+            return {"url": url, "digest": None}
+        entry = {"url": url, "digest": digest}
+        self._write_atomic(self._key_path(key), json.dumps(entry).encode("utf-8"))
+        self._evict()
+        return entry
+
+    def blob_path(self, digest):
+        if not self._blob_dir or not DIGEST_RE.match(digest):
+            return None
+        path = self._blob_path(digest)
+        return path if os.path.exists(path) else None
+
+    def _blob_path(self, digest):
+        return os.path.join(self._blob_dir, "blobs", digest[:2], digest)
+
+    def _key_path(self, key):
+        return os.path.join(self._blob_dir, "keys", key)
+
+    def _read_key(self, key):
+        try:
+            with open(self._key_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _touch(self, digest):
+        try:
+            os.utime(self._blob_path(digest))
+            return True
+        except OSError:
+            return False  # Blob was evicted; treat as a miss
+
+    def _download(self, url):
+        if not url.startswith(("http://", "https://")):
+            return None
+        try:
+            with urllib.request.urlopen(url, timeout=self._download_timeout) as response:
+                body = response.read(MAX_IMAGE_BYTES + 1)
+        except Exception:
+            return None
+        if not body or len(body) > MAX_IMAGE_BYTES:
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_atomic(path, body)
+        return digest
+
+    def _write_atomic(self, path, body):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def _evict(self):
+        # Scanning is cheap next to an image generation and keeps the size
+        # bound correct across worker processes.
+        blobs = []
+        total = 0
+        root = os.path.join(self._blob_dir, "blobs")
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                if not DIGEST_RE.match(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self._max_bytes:
+            return
+        blobs.sort()
+        evicted = 0
+        for _, size, path in blobs:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._sweep_keys()
+        if evicted and self._on_evict is not None:
+            self._on_evict("disk", evicted)
+
+    def _sweep_keys(self):
+        # Drop key files whose blob is gone, so keys/ stays as bounded as the
+        # blobs themselves
+        root = os.path.join(self._blob_dir, "keys")
+        try:
+            names = os.listdir(root)
+        except OSError:
+            return
+        for name in names:
+            if not DIGEST_RE.match(name):
+                continue
+            entry = self._read_key(name)
+            if entry is not None and self.blob_path(entry.get("digest") or "") is not None:
+                continue
+            try:
+                os.remove(os.path.join(root, name))
+            except OSError:
+                pass
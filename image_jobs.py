@@ -0,0 +1,181 @@
+import ipaddress
+import json
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# Image generations run on bounded per-model worker pools instead of request
+# threads, one pool per known backend model; jobs for any other model are
+# refused, so clients can't make the service grow new pools. A job is queued,
+# runs when its model has a free slot, and its result stays retrievable for
+# `ttl` seconds after it finishes. Callers can wait for it, poll it by id, or
+# be notified through a callback URL. Results can be relative URLs (locally
+# cached images); the callback gets them made absolute with the base URL the
+# job was submitted with, as a poll of the job would.
+#
+# Callback URLs come from clients, so they must not reach the service's own
+# network: unless its host is on the configured allowlist, a URL is refused
+# when its host resolves to a private, loopback, link-local or otherwise
+# non-public address (cloud metadata endpoints included). The check runs at
+# submit time, so bad URLs get a 400, and again before the POST, since DNS
+# may have changed in between. Redirects are not followed.
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class InvalidCallback(Exception):
+    pass
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirects)
+
+
+def check_callback_url(url, allowed_hosts=()):
+    # Raises InvalidCallback unless url is an http(s) URL on an allowed host
+    # or one that only resolves to public addresses
+    try:
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise InvalidCallback("Invalid callback_url")
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise InvalidCallback("callback_url must be an http or https URL")
+    host = parts.hostname.lower()
+    if host in allowed_hosts:
+        return
+    if allowed_hosts:
+        raise InvalidCallback(f"callback_url host {host} is not allowed")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, UnicodeError):
+        raise InvalidCallback(f"callback_url host {host} does not resolve")
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise InvalidCallback(f"callback_url host {host} is not a public address")
+
+
+class ImageJobs:
+    def __init__(self, run, models, per_model_limit=2, max_pending=64, ttl=3600.0, callback_timeout=10.0,
+                 callback_hosts=()):
+        # run(backend_model, prompt, params) -> image URL
+        self._run = run
+        self._callback_hosts = frozenset(h.lower() for h in callback_hosts)
+        self._max_pending = max_pending
+        self._ttl = ttl
+        self._callback_timeout = callback_timeout
+        self._lock = threading.Lock()
+        self._pools = {
+            model: ThreadPoolExecutor(per_model_limit, thread_name_prefix=f"image-{model}") for model in models
+        }
+        self._jobs = {}
+        self._pending = 0
+
+    def submit(self, backend_model, prompt, params=None, callback_url=None, base_url=""):
+        pool = self._pools.get(backend_model)
+        if pool is None:
+            raise ValueError(f"Unknown image model: {backend_model}")
+        if callback_url:
+            check_callback_url(callback_url, self._callback_hosts)
+        self._purge()
+        with self._lock:
+            if self._pending >= self._max_pending:
+                raise JobQueueFull(f"{self._pending} image jobs already pending")
+            self._pending += 1
+            job = {
+                "id": f"imgjob-{uuid.uuid4().hex}",
+                "object": "image.job",
+                "model": backend_model,
+                "status": QUEUED,
+                "created": int(time.time()),
+                "finished": None,
+                "url": None,
+                "error": None,
+            }
+            callback = (callback_url, base_url.rstrip("/")) if callback_url else None
+            self._jobs[job["id"]] = (job, None, (prompt, params or {}), callback)
+        future = pool.submit(self._execute, job["id"])
+        with self._lock:
+            self._jobs[job["id"]] = (job, future, (prompt, params or {}), callback)
+        return dict(job)
+
+    def get(self, job_id):
+        self._purge()
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record[0]) if record else None
+
+    def wait(self, job_id, timeout):
+        # Block until the job finishes or `timeout` passes; returns the job
+        # view either way so a timed-out caller can hand out the id to poll.
+        with self._lock:
+            record = self._jobs.get(job_id)
+        if record is None:
+            return None
+        try:
+            record[1].result(timeout=timeout)
+        except FutureTimeout:
+            pass
+        return self.get(job_id)
+
+    def _execute(self, job_id):
+        with self._lock:
+            job, _, (prompt, params), callback = self._jobs[job_id]
+            job["status"] = RUNNING
+        try:
+            url = self._run(job["model"], prompt, params)
+        except Exception as e:
+            with self._lock:
+                job["status"] = FAILED
+                job["error"] = str(e) or type(e).__name__
+        else:
+            with self._lock:
+                job["status"] = SUCCEEDED
+                job["url"] = url
+        finally:
+            with self._lock:
+                job["finished"] = int(time.time())
+                self._pending -= 1
+        if callback:
+            self._notify(*callback, self.get(job_id))
+
+    def _notify(self, callback_url, base_url, job):
+        try:
+            check_callback_url(callback_url, self._callback_hosts)
+        except InvalidCallback:
+            return
+        if job["url"] and job["url"].startswith("/"):
+            job["url"] = base_url + job["url"]
+        body = json.dumps(job).encode("utf-8")
+        req = urllib.request.Request(
+            callback_url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            _opener.open(req, timeout=self._callback_timeout).close()
+        except Exception:
+            pass  # Result stays available for polling
+
+    def _purge(self):
+        cutoff = time.time() - self._ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, (job, _, _, _) in self._jobs.items()
+                if job["finished"] is not None and job["finished"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,180 @@
+import json
+import os
+import queue
+import re
+import threading
+
+# Request journal: one compact JSON line per chat or image request (model,
+# message sizes, key index, time to first token, duration, outcome), for
+# rebuilding real traffic offline (see benchmarks/replay.py). record() only
+# puts the dict on a bounded queue; a background thread encodes whatever has
+# queued up, writes it in one go and rotates the file by size, so request
+# threads never touch the disk. When the queue is full, records are dropped
+# rather than making requests wait.
+#
+# A "{pid}" in the path is replaced by the writing process's id, which gives
+# each gunicorn worker its own file.
+#
+# Message content is only kept when asked for: "full" writes it as sent,
+# "redacted" masks e-mail addresses, long numbers and key-like tokens first.
+
+CONTENT_MODES = ("none", "redacted", "full")
+
+REDACTIONS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[email]"),
+    (re.compile(r"\b(?:sk|pk|rk|key|tok)[-_][A-Za-z0-9_-]{8,}\b"), "[secret]"),
+    (re.compile(r"\b[A-Za-z0-9_-]{32,}\b"), "[secret]"),
+    (re.compile(r"\+?\d[\d -]{6,}\d"), "[number]"),
+)
+
+_STOP = object()
+
+
+def redact(text):
+    for pattern, replacement in REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def content_chars(content):
+    # Characters of text in a message's content, which may be a list of parts
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(p.get("text") or "") for p in content if isinstance(p, dict))
+    return 0
+
+
+def message_sizes(messages):
+    # [[role, chars], ...]: enough to rebuild a request of the same shape
+    return [[m.get("role", "user"), content_chars(m.get("content"))] for m in messages if isinstance(m, dict)]
+
+
+def _redact_message(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return dict(message, content=redact(content))
+    if isinstance(content, list):
+        return dict(message, content=[
+            dict(p, text=redact(p["text"])) if isinstance(p, dict) and isinstance(p.get("text"), str) else p
+            for p in content
+        ])
+    return message
+
+
+class Journal:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5, batch_size=512, max_pending=10000,
+                 content="none", on_drop=None):
+        # on_drop(count, reason) is called for records that were never written
+        if content not in CONTENT_MODES:
+            raise ValueError(f"Unknown journal content mode: {content}")
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        self.content = content
+        self._on_drop = on_drop
+        self._spawn()
+        if hasattr(os, "register_at_fork"):
+            # Threads don't survive fork; a preloaded app's workers need their own
+            os.register_at_fork(after_in_child=self._spawn)
+
+    def _spawn(self):
+        self._queue = queue.Queue(self._max_pending)
+        self._writer = threading.Thread(target=self._run, args=(self._queue,), name="journal-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, entry):
+        # entry must not be mutated afterwards; it is encoded on the writer thread
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._dropped(1, "queue_full")
+
+    def close(self, timeout=5.0):
+        # Write out what is queued and stop the writer
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._writer.join(timeout)
+
+    def _dropped(self, count, reason):
+        if self._on_drop is not None:
+            self._on_drop(count, reason)
+
+    def _encode(self, entry):
+        if self.content == "redacted" and entry.get("content"):
+            entry = dict(entry, content=[_redact_message(m) for m in entry["content"] if isinstance(m, dict)])
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+    def _run(self, q):
+        path = self._path.replace("{pid}", str(os.getpid()))
+        directory = os.path.dirname(path)
+        f = None
+        stopping = False
+        while not stopping:
+            batch = [q.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            if not batch:
+                continue
+            try:
+                data = "".join(self._encode(e) for e in batch).encode("utf-8")
+                if f is None or self._replaced(f, path):
+                    if f is not None:
+                        f.close()
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    f = open(path, "ab")
+                if f.tell() and f.tell() + len(data) > self._max_bytes:
+                    f.close()
+                    self._rotate(path)
+                    f = open(path, "ab")
+                f.write(data)
+                f.flush()
+            except (OSError, TypeError, ValueError):
+                self._dropped(len(batch), "write_error")
+                if f is not None:
+                    f.close()
+                    f = None
+        if f is not None:
+            f.close()
+
+    @staticmethod
+    def _replaced(f, path):
+        # Another process sharing the path rotated it away from under us
+        try:
+            return os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _rotate(self, path):
+        # path -> path.1 -> ... -> path.<backups>; the oldest is overwritten
+        if self._backups <= 0:
+            os.remove(path)
+            return
+        for i in range(self._backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+
+def read(paths):
+    # Records from journal files, oldest file first when given rotated names
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # A torn last line from a crash
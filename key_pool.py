@@ -0,0 +1,215 @@
+import os
+import re
+import threading
+import time
+
+# Per-key health tracking with a simple circuit breaker.
+#
+# closed    -> key is healthy and handed out normally
+# open      -> key failed (429/401 or repeated errors) and sits out a cooldown
+# half-open -> cooldown expired; one request (or background probe) may try it
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Cooldowns in seconds by failure kind; doubled for every consecutive trip.
+COOLDOWNS = {
+    "rate_limited": 60.0,
+    "unauthorized": 900.0,
+    "error": 15.0,
+}
+
+TRIAL_LEASE = 120.0
+
+# g4f reports upstream HTTP errors as "Response <status>: <message>"
+STATUS_RE = re.compile(r"^response (\d{3})\b")
+
+
+def failure_status(exc):
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None)
+    if isinstance(status, int):
+        return status
+    match = STATUS_RE.match(str(exc).lower())
+    return int(match.group(1)) if match else None
+
+
+def classify_failure(exc):
+    # "request" is an upstream 4xx the request itself caused (a payload the
+    # backend refuses); it says nothing about the key, so it doesn't count
+    status = failure_status(exc)
+    name = type(exc).__name__.lower()
+    text = str(exc).lower()
+    if status == 429 or "ratelimit" in name or "rate limit" in text:
+        return "rate_limited"
+    if status in (401, 402, 403) or "auth" in name or "unauthorized" in text:
+        return "unauthorized"
+    if status is not None and 400 <= status < 500:
+        return "request"
+    return "error"
+
+
+class KeyState:
+    __slots__ = (
+        "index", "key", "consecutive_failures", "trips", "last_failure_kind",
+        "last_failure_at", "last_429_at", "last_401_at", "cooldown_until",
+        "last_used", "trial_started",
+    )
+
+    def __init__(self, index, key):
+        self.index = index
+        self.key = key
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.last_failure_kind = None
+        self.last_failure_at = 0.0
+        self.last_429_at = 0.0
+        self.last_401_at = 0.0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+        self.trial_started = None
+
+    def state(self, now):
+        if self.trips == 0:
+            return CLOSED
+        if now < self.cooldown_until:
+            return OPEN
+        return HALF_OPEN
+
+    def trial_available(self, now):
+        # A trial lease lapses if the request that took it never reported back
+        # (e.g. an earlier key in its candidate list succeeded first).
+        return self.trial_started is None or now - self.trial_started > TRIAL_LEASE
+
+
+class KeyPool:
+    def __init__(self, keys, strategy="round_robin", failure_threshold=3, max_cooldown=3600.0):
+        if strategy not in ("round_robin", "lru"):
+            raise ValueError(f"Unknown key pool strategy: {strategy}")
+        self._states = [KeyState(i, key) for i, key in enumerate(keys)]
+        self._by_key = {s.key: s for s in self._states}
+        self._strategy = strategy
+        self._failure_threshold = failure_threshold
+        self._max_cooldown = max_cooldown
+        self._cursor = 0
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def __len__(self):
+        return len(self._states)
+
+    def index_of(self, key):
+        return self._by_key[key].index
+
+    def candidates(self):
+        # Keys to try for one request, best first: healthy keys in strategy
+        # order, then at most one half-open key per request as a trial. When
+        # every circuit is open, the key closest to recovery is the last resort.
+        now = time.monotonic()
+        with self._lock:
+            healthy = [s for s in self._states if s.state(now) == CLOSED]
+            if self._strategy == "lru":
+                healthy.sort(key=lambda s: s.last_used)
+            elif healthy:
+                start = self._cursor % len(healthy)
+                healthy = healthy[start:] + healthy[:start]
+                self._cursor += 1
+
+            ordered = [s.key for s in healthy]
+            for s in self._states:
+                if s.state(now) == HALF_OPEN and s.trial_available(now):
+                    s.trial_started = now
+                    ordered.append(s.key)
+                    break
+
+            if not ordered and self._states:
+                soonest = min(self._states, key=lambda s: s.cooldown_until)
+                ordered.append(soonest.key)
+        return ordered
+
+    def mark_used(self, key):
+        with self._lock:
+            self._by_key[key].last_used = time.monotonic()
+
+    def report_success(self, key):
+        with self._lock:
+            s = self._by_key[key]
+            s.consecutive_failures = 0
+            s.trips = 0
+            s.cooldown_until = 0.0
+            s.trial_started = None
+
+    def report_failure(self, key, exc=None):
+        kind = classify_failure(exc) if exc is not None else "error"
+        now = time.monotonic()
+        with self._lock:
+            s = self._by_key[key]
+            s.trial_started = None
+            if kind == "request":
+                return kind  # Key health unknown; a trial key may be tried again
+            s.consecutive_failures += 1
+            s.last_failure_kind = kind
+            s.last_failure_at = time.time()
+            if kind == "rate_limited":
+                s.last_429_at = s.last_failure_at
+            elif kind == "unauthorized":
+                s.last_401_at = s.last_failure_at
+
+            # Rate limits and auth failures trip immediately; generic errors
+            # only after a run of them, so one flaky stream doesn't bench a key.
+            if kind != "error" or s.consecutive_failures >= self._failure_threshold or s.trips:
+                cooldown = min(COOLDOWNS[kind] * (2 ** s.trips), self._max_cooldown)
+                s.trips += 1
+                s.cooldown_until = now + cooldown
+        return kind
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "index": s.index,
+                    "state": s.state(now),
+                    "consecutive_failures": s.consecutive_failures,
+                    "last_failure_kind": s.last_failure_kind,
+                    "last_429_at": s.last_429_at or None,
+                    "last_401_at": s.last_401_at or None,
+                    "cooldown_remaining": max(0.0, round(s.cooldown_until - now, 1)),
+                }
+                for s in self._states
+            ]
+
+    def start_prober(self, probe, interval):
+        # Background thread that tries keys whose cooldown has expired, so they
+        # rejoin the healthy set without a live request paying for the trial.
+        if self._prober is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                now = time.monotonic()
+                with self._lock:
+                    due = [s for s in self._states if s.state(now) == HALF_OPEN and s.trial_available(now)]
+                    for s in due:
+                        s.trial_started = now
+                for s in due:
+                    try:
+                        probe(s.key)
+                    except Exception as e:
+                        self.report_failure(s.key, e)
+                    else:
+                        self.report_success(s.key)
+
+        def spawn():
+            self._prober = threading.Thread(target=run, name="key-pool-prober", daemon=True)
+            self._prober.start()
+
+        def after_fork():
+            # Threads don't survive fork; a preloaded app's workers need their own
+            self._lock = threading.Lock()
+            spawn()
+
+        spawn()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=after_fork)
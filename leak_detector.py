@@ -0,0 +1,46 @@
+import re
+import threading
+
+# Detects requests that ask for a model's system prompt. All trigger phrases
+# are compiled into one case-insensitive alternation at startup, and only the
+# newest user turn is scanned: earlier turns were already checked when they
+# were the newest, so per-request cost is O(new input) rather than
+# O(history x triggers). on_scan(chars, trigger), if given, is called for
+# every scan with the number of characters scanned and the matched trigger
+# (None when nothing matched).
+
+
+class PromptLeakDetector:
+    def __init__(self, triggers, on_scan=None):
+        self._lock = threading.Lock()
+        self._triggers = []
+        self._pattern = None
+        self._on_scan = on_scan
+        self.add_triggers(triggers)
+
+    def add_triggers(self, triggers):
+        with self._lock:
+            for trigger in triggers:
+                trigger = trigger.strip().lower()
+                if trigger and trigger not in self._triggers:
+                    self._triggers.append(trigger)
+            # Longest first so overlapping phrases report the most specific hit
+            alternation = "|".join(re.escape(t) for t in sorted(self._triggers, key=len, reverse=True))
+            self._pattern = re.compile(alternation, re.IGNORECASE) if alternation else None
+
+    def scan(self, user_messages):
+        text = latest_user_content(user_messages)
+        pattern = self._pattern
+        match = pattern.search(text) if pattern is not None and text else None
+        trigger = match.group(0).lower() if match else None
+        if self._on_scan is not None:
+            self._on_scan(len(text), trigger)
+        return trigger
+
+
+def latest_user_content(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content", "")
+            return content if isinstance(content, str) else ""
+    return ""
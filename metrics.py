@@ -0,0 +1,265 @@
+import hashlib
+import os
+import time
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Prometheus instrumentation. Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to
+# an empty directory shared by the workers; each worker then writes its
+# samples to mmap'd files and /metrics aggregates them (see gunicorn.conf.py).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+PHASE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 80, 160, 320, 640)
+SIMILARITY_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.0)
+
+REQUESTS = Counter(
+    "answer_api_requests_total",
+    "Requests handled, by route, frontend model and outcome",
+    ["route", "model", "outcome"],
+)
+PHASE_SECONDS = Histogram(
+    "answer_api_phase_seconds",
+    "Time spent in request phases before the upstream call",
+    ["route", "model", "phase"],
+    buckets=PHASE_BUCKETS,
+)
+UPSTREAM_ATTEMPTS = Counter(
+    "answer_api_upstream_attempts_total",
+    "Upstream attempts, by frontend model, backend, hashed key and outcome",
+    ["model", "backend", "key", "outcome"],
+)
+ATTEMPT_SECONDS = Histogram(
+    "answer_api_upstream_attempt_seconds",
+    "Time from starting an upstream attempt to its first token or failure",
+    ["model", "backend", "key", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+TTFT_SECONDS = Histogram(
+    "answer_api_time_to_first_token_seconds",
+    "Time from request arrival to the first streamed token",
+    ["model", "backend"],
+    buckets=LATENCY_BUCKETS,
+)
+TOKENS_PER_SECOND = Histogram(
+    "answer_api_stream_tokens_per_second",
+    "Estimated output tokens per second after the first token",
+    ["model", "backend"],
+    buckets=RATE_BUCKETS,
+)
+STREAM_SECONDS = Histogram(
+    "answer_api_stream_duration_seconds",
+    "Total duration of a chat response",
+    ["model", "backend", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+IMAGE_SECONDS = Histogram(
+    "answer_api_image_generation_seconds",
+    "Duration of image generations",
+    ["model", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "answer_api_cache_lookups_total",
+    "Response cache and coalescing lookups",
+    ["cache", "result"],
+)
+CACHE_EVICTIONS = Counter(
+    "answer_api_cache_evictions_total",
+    "Cache entries evicted for size or expiry, by cache and tier (memory, disk)",
+    ["cache", "tier"],
+)
+IN_FLIGHT = Gauge(
+    "answer_api_in_flight_streams",
+    "Upstream chat streams currently open",
+    multiprocess_mode="livesum",
+)
+CONTEXT_TRIMMED_TOKENS = Counter(
+    "answer_api_context_trimmed_tokens_total",
+    "Estimated history tokens removed to fit backend context windows",
+    ["model", "strategy"],
+)
+CONTEXT_REJECTED = Counter(
+    "answer_api_context_rejected_total",
+    "Requests rejected because even the newest turn exceeds the context window",
+    ["model"],
+)
+SYSTEM_PROMPT_BYTES = Gauge(
+    "answer_api_system_prompt_bytes",
+    "Size of each model's system prompt",
+    ["model"],
+    multiprocess_mode="max",
+)
+SYSTEM_PROMPT_TOKENS = Gauge(
+    "answer_api_system_prompt_tokens",
+    "Estimated tokens in each model's system prompt",
+    ["model"],
+    multiprocess_mode="max",
+)
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "answer_api_scheduler_wait_seconds",
+    "Time upstream calls spent queued in the priority scheduler, by class and outcome",
+    ["class", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+ROUTE_SELECTIONS = Counter(
+    "answer_api_route_selections_total",
+    "Provider routes tried for chat requests: preferred (configured first), reranked (another route ranked first) or failover",
+    ["model", "provider", "backend", "position"],
+)
+ROUTE_LATENCY = Gauge(
+    "answer_api_route_latency_ewma_seconds",
+    "Router's smoothed time to first token per route",
+    ["model", "provider", "backend"],
+    multiprocess_mode="mostrecent",
+)
+ROUTE_ERROR_RATE = Gauge(
+    "answer_api_route_error_rate_ewma",
+    "Router's smoothed failure rate per route",
+    ["model", "provider", "backend"],
+    multiprocess_mode="mostrecent",
+)
+PROMPT_CACHE_TOKENS = Counter(
+    "answer_api_prompt_cache_tokens_total",
+    "Upstream-reported prompt tokens, by model, backend and kind (prompt, cache_read, cache_write)",
+    ["model", "backend", "kind"],
+)
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "answer_api_semantic_cache_lookups_total",
+    "Near-duplicate cache lookups by model and result (hit, miss, skipped, shadow_hit)",
+    ["model", "result"],
+)
+SEMANTIC_CACHE_SIMILARITY = Histogram(
+    "answer_api_semantic_cache_similarity",
+    "Similarity of the nearest cached request, for hits and misses alike",
+    ["model", "result"],
+    buckets=SIMILARITY_BUCKETS,
+)
+SEMANTIC_CACHE_AGREEMENT = Histogram(
+    "answer_api_semantic_cache_agreement",
+    "Shadow mode: similarity of the answer a hit would have served to the fresh upstream answer",
+    ["model"],
+    buckets=SIMILARITY_BUCKETS,
+)
+LEAK_SCANS = Counter(
+    "answer_api_prompt_leak_scans_total",
+    "Chat requests scanned for system prompt extraction phrases",
+)
+LEAK_SCANNED_CHARS = Counter(
+    "answer_api_prompt_leak_scanned_chars_total",
+    "Characters of user input scanned for system prompt extraction phrases",
+)
+LEAK_MATCHES = Counter(
+    "answer_api_prompt_leak_matches_total",
+    "Scans that matched a system prompt extraction phrase, by trigger",
+    ["trigger"],
+)
+JOURNAL_DROPPED = Counter(
+    "answer_api_journal_dropped_total",
+    "Request journal records never written, by reason (queue_full, write_error)",
+    ["reason"],
+)
+STARTUP_SECONDS = Gauge(
+    "answer_api_startup_seconds",
+    "Seconds from the start of importing app.py to the end of each startup phase (import, ready)",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+
+@lru_cache(maxsize=1024)
+def key_label(api_key):
+    # Never export raw keys; a short digest is enough to tell keys apart
+    if not api_key:
+        return "none"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:10]
+
+
+def render():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class ChatMetrics:
+    # Per-request recorder for one chat completion. Timestamps are monotonic;
+    # each method does one or two label lookups, so the streaming hot path
+    # only pays for first_token() and finish(). `started` is when the request
+    # arrived, before its body was read. on_done(recorder, outcome), if
+    # given, is called once the request's outcome is known.
+
+    def __init__(self, route, model, backend="", on_done=None, started=None):
+        self.route = route
+        self.model = model
+        self.backend = backend
+        self.on_done = on_done
+        self.started = time.monotonic() if started is None else started
+        self._mark = self.started
+        self._attempt_starts = {}
+        self._first_token_at = None
+        self.api_key = None
+        self.output_tokens = 0
+
+    def phase(self, name):
+        now = time.monotonic()
+        PHASE_SECONDS.labels(self.route, self.model, name).observe(now - self._mark)
+        self._mark = now
+
+    def request(self, outcome):
+        REQUESTS.labels(self.route, self.model, outcome).inc()
+        if self.on_done is not None:
+            self.on_done(self, outcome)
+
+    def attempt_started(self, api_key):
+        self.api_key = api_key
+        self._attempt_starts[api_key] = time.monotonic()
+
+    def attempt_finished(self, api_key, outcome):
+        if outcome == "ok":
+            self.api_key = api_key
+        key = key_label(api_key)
+        UPSTREAM_ATTEMPTS.labels(self.model, self.backend, key, outcome).inc()
+        started = self._attempt_starts.pop(api_key, None)
+        if started is not None:
+            ATTEMPT_SECONDS.labels(self.model, self.backend, key, outcome).observe(time.monotonic() - started)
+
+    def first_token(self):
+        if self._first_token_at is None:
+            self._first_token_at = time.monotonic()
+            TTFT_SECONDS.labels(self.model, self.backend).observe(self._first_token_at - self.started)
+
+    @property
+    def ttft(self):
+        return None if self._first_token_at is None else self._first_token_at - self.started
+
+    def coalesced(self, leader, output_tokens=None):
+        # Finish a request another request's upstream call answered (request
+        # coalescing): it reports the leader's backend, key, TTFT and output
+        self.backend = leader.backend
+        self.api_key = leader.api_key
+        if leader.ttft is not None:
+            self._first_token_at = self.started + leader.ttft
+        self.output_tokens = leader.output_tokens if output_tokens is None else output_tokens
+        STREAM_SECONDS.labels(self.model, self.backend, "coalesced").observe(time.monotonic() - self.started)
+        self.request("coalesced")
+
+    def finish(self, outcome, output_tokens=0):
+        now = time.monotonic()
+        self.output_tokens = output_tokens
+        STREAM_SECONDS.labels(self.model, self.backend, outcome).observe(now - self.started)
+        if self._first_token_at is not None and output_tokens and now > self._first_token_at:
+            TOKENS_PER_SECOND.labels(self.model, self.backend).observe(output_tokens / (now - self._first_token_at))
+        self.request(outcome)
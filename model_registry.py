@@ -0,0 +1,70 @@
+import hashlib
+import json
+
+# The model catalogue served at /v1/models. MODEL_MAPPING (and the image
+# model list) decide which models exist; models.json supplies their public
+# metadata. Anything served but missing from models.json gets a minimal
+# entry, and anything in models.json that isn't served is left out, so the
+# catalogue can never advertise a model the routes would reject. Bodies and
+# ETags are rendered once at startup; requests only compare and copy bytes.
+
+DEFAULT_CREATED = 1731028323
+DEFAULT_OWNER = "BotIntel"
+
+# Fields kept out of the public catalogue
+PRIVATE_FIELDS = ("backend",)
+
+
+def render(body):
+    payload = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return payload, '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    # Weak comparison, as If-None-Match calls for
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ModelRegistry:
+    def __init__(self, catalogue, chat_models, image_models=()):
+        # catalogue: parsed models.json; chat_models/image_models: served ids
+        described = {m["id"]: m for m in catalogue.get("data", []) if "id" in m}
+        self._models = {}
+        for model_id, route in [(m, "v1/chat/completions") for m in chat_models] + \
+                               [(m, "v1/images/generations") for m in image_models]:
+            entry = {
+                "id": model_id,
+                "object": "model",
+                "created": DEFAULT_CREATED,
+                "owned_by": DEFAULT_OWNER,
+                "type": route,
+            }
+            entry.update((k, v) for k, v in described.get(model_id, {}).items() if k not in PRIVATE_FIELDS)
+            entry["type"] = route
+            self._models[model_id] = render(entry)
+
+        self._list = render({
+            "object": "list",
+            "data": [json.loads(payload) for payload, _ in self._models.values()],
+        })
+
+    def list_body(self):
+        # (payload bytes, etag)
+        return self._list
+
+    def model_body(self, model_id):
+        return self._models.get(model_id)
+
+    def ids(self):
+        return list(self._models)
+
+
+def load(path, chat_models, image_models=()):
+    with open(path, encoding="utf-8") as f:
+        return ModelRegistry(json.load(f), chat_models, image_models)
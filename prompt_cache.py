@@ -0,0 +1,49 @@
+# Upstream prompt caching. Every chat request starts with its model's system
+# prompt, byte-identical from one request to the next, so backends with a
+# prefix cache can read it from cache instead of processing it again.
+#
+#   openai     caches long prefixes automatically; prompt_cache_key groups
+#              requests sharing a prefix so they land on the same cache
+#   anthropic  caches only up to explicit cache_control breakpoints, so the
+#              system message is sent as a text block carrying one
+#
+# Other backends get the plain messages. Hints only help while the prefix is
+# stable: nothing request-specific may go into or before the system message.
+
+HINT_STYLES = ("openai", "anthropic")
+
+
+def hint_style(backend):
+    # "openrouter:openai/gpt-5.2" -> "openai", "anthropic:anthropic/claude-opus-4-5" -> "anthropic"
+    vendor = backend.split(":", 1)[-1].split("/", 1)[0]
+    return vendor if vendor in HINT_STYLES else None
+
+
+def anthropic_system_message(text):
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}],
+    }
+
+
+def _get(obj, name):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def cache_tokens(usage):
+    # (prompt, cache read, cache write) tokens from an upstream usage object
+    # or dict, in either the OpenAI or the Anthropic shape; None if absent
+    if usage is None:
+        return None
+    details = _get(usage, "prompt_tokens_details")
+    read = _get(usage, "cache_read_input_tokens") or _get(details, "cached_tokens") or 0
+    write = _get(usage, "cache_creation_input_tokens") or _get(details, "cache_write_tokens") or 0
+    prompt = _get(usage, "prompt_tokens")
+    if prompt is None:
+        # Anthropic's input_tokens leaves out the cached part
+        prompt = (_get(usage, "input_tokens") or 0) + read + write
+    return prompt or 0, read, write
@@ -0,0 +1,52 @@
+import hashlib
+
+from prompt_cache import anthropic_system_message, hint_style
+from tokens import estimate_tokens
+
+# System prompts are built once at startup. Each model gets one shared system
+# message dict plus its byte length and token estimate, so a request only
+# allocates a new list header around the caller's messages.
+# The shared dicts are read-only by convention: never mutate entry.message.
+# Backends with a prompt cache get a hinted variant of the same prefix, also
+# built once (see prompt_cache.py).
+
+
+class PromptEntry:
+    __slots__ = ("model", "message", "byte_length", "token_count", "digest",
+                 "anthropic_message", "cache_key")
+
+    def __init__(self, model, text):
+        self.model = model
+        self.message = {"role": "system", "content": text}
+        encoded = text.encode("utf-8")
+        self.byte_length = len(encoded)
+        self.token_count = estimate_tokens(text)
+        self.digest = hashlib.sha256(encoded).hexdigest()
+        self.anthropic_message = anthropic_system_message(text)
+        # Changes whenever the prompt does, so stale cache entries aren't targeted
+        self.cache_key = f"{model}-{self.digest[:16]}"
+
+
+class PromptRegistry:
+    def __init__(self, prompts):
+        self._entries = {model: PromptEntry(model, text) for model, text in prompts.items()}
+
+    def get(self, model):
+        return self._entries[model]
+
+    def text(self, model):
+        return self._entries[model].message["content"]
+
+    def messages(self, model, user_messages):
+        return [self._entries[model].message, *user_messages]
+
+    def cache_hinted(self, model, backend, messages):
+        # (messages, extra request kwargs) for `backend`, where messages came
+        # from messages() and so start with the shared system message
+        entry = self._entries[model]
+        style = hint_style(backend)
+        if style == "anthropic":
+            return [entry.anthropic_message, *messages[1:]], {}
+        if style == "openai":
+            return messages, {"prompt_cache_key": entry.cache_key}
+        return messages, {}
@@ -0,0 +1,49 @@
+import importlib
+import threading
+
+# Lazy access to g4f. Importing g4f.client and g4f.Provider costs a few
+# hundred milliseconds, most of it in providers this service never calls, so
+# nothing here is imported until first use. Under gunicorn, preload() runs in
+# the master before forking (see gunicorn.conf.py) so workers share the
+# loaded modules instead of each paying for them.
+
+_lock = threading.Lock()
+_providers = {}
+_clients = {}
+
+
+def provider(name):
+    # The g4f provider class called `name`
+    found = _providers.get(name)
+    if found is not None:
+        return found
+    with _lock:
+        if name not in _providers:
+            found = getattr(importlib.import_module("g4f.Provider"), name, None)
+            if found is None:
+                raise ValueError(f"Unknown g4f provider: {name}")
+            _providers[name] = found
+        return _providers[name]
+
+
+def client_class(name="Client"):
+    found = _clients.get(name)
+    if found is None:
+        with _lock:
+            found = _clients[name] = getattr(importlib.import_module("g4f.client"), name)
+    return found
+
+
+def client():
+    return client_class("Client")()
+
+
+def async_client():
+    return client_class("AsyncClient")()
+
+
+def preload(names, clients=("Client",)):
+    for name in clients:
+        client_class(name)
+    for name in names:
+        provider(name)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Exact-match cache for chat completions. An entry is the list of content
+# deltas an upstream stream produced, so a hit can be replayed as the same
+# SSE chunk sequence generate() would have emitted.
+#
+# The optional disk tier is shared by workers. It is swept at most once per
+# `disk_sweep_interval` by whichever worker stores next, on a background
+# thread so the request that stored doesn't wait for it: expired files go
+# first, then the oldest until the tier fits `disk_max_bytes`.
+# on_evict(tier, count), if given, is called with "memory" or "disk" and the
+# number of entries evicted from that tier.
+
+# Request fields that change the completion and therefore belong in the key
+SAMPLING_PARAMS = (
+    "temperature", "top_p", "max_tokens", "stop", "presence_penalty",
+    "frequency_penalty", "seed", "n", "response_format", "tools", "tool_choice",
+)
+
+
+def cache_key(model, messages, data):
+    params = {name: data[name] for name in SAMPLING_PARAMS if name in data}
+    canonical = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def entry_size(chunks):
+    return sum(len(c.encode("utf-8")) for c in chunks if c)
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=600.0, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024,
+                 disk_sweep_interval=60.0, on_evict=None):
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._disk_dir = disk_dir
+        self._disk_max_bytes = disk_max_bytes
+        self._disk_sweep_interval = disk_sweep_interval
+        self._next_sweep = 0.0
+        self._on_evict = on_evict
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, size, chunks)
+        self._bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[2]
+                self._remove(key)
+
+        chunks = self._disk_get(key, now)
+        if chunks is None:
+            return None
+        self._memory_put(key, chunks, now)
+        return chunks
+
+    def put(self, key, chunks):
+        chunks = list(chunks)
+        now = time.time()
+        self._memory_put(key, chunks, now)
+        self._disk_put(key, chunks, now)
+
+    def _memory_put(self, key, chunks, now):
+        size = entry_size(chunks)
+        if size > self._max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + self._ttl, size, chunks)
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+        if evicted and self._on_evict is not None:
+            self._on_evict("memory", evicted)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key):
+        return os.path.join(self._disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key, now):
+        if not self._disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return record["chunks"]
+
+    def _disk_put(self, key, chunks, now):
+        if not self._disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": now + self._ttl, "chunks": chunks}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+        with self._lock:
+            due = now >= self._next_sweep
+            if due:
+                self._next_sweep = now + self._disk_sweep_interval
+        if due:
+            threading.Thread(target=self._sweep, args=(now,), name="response-cache-sweep", daemon=True).start()
+
+    def _sweep(self, now):
+        # Files are written once, so mtime + ttl is their expiry. Scanning
+        # keeps the bound correct across worker processes.
+        files = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self._disk_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        files.sort()
+        evicted = 0
+        for mtime, size, path in files:
+            if total <= self._disk_max_bytes and mtime + self._ttl > now:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted and self._on_evict is not None:
+            self._on_evict("disk", evicted)
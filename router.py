@@ -0,0 +1,123 @@
+import json
+import random
+import threading
+import time
+
+# Provider routing for chat models. Each frontend model has an ordered list of
+# routes (a g4f provider plus the backend model name it expects); requests try
+# them best first and fail over to the next route when one is exhausted.
+#
+# Routes are ranked by an EWMA of their latency to first token, inflated by
+# an EWMA of their failure rate. A route's rank is also multiplied by
+# (1 + bias * position), so a later route must be clearly faster before it
+# overtakes the configured preference. Routes that haven't been seen for a
+# while are occasionally tried first so their estimates stay current.
+
+DEFAULT_LATENCY = 1.0
+
+
+class Route:
+    __slots__ = ("provider", "backend", "keyed", "latency", "error_rate", "samples", "last_seen")
+
+    def __init__(self, provider, backend, keyed=True):
+        self.provider = provider
+        self.backend = backend
+        # Keyed routes take a key from the pool; others are called without one
+        self.keyed = keyed
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.last_seen = 0.0
+
+    def score(self, error_weight):
+        return (self.latency or DEFAULT_LATENCY) * (1 + error_weight * self.error_rate)
+
+
+class ProviderRouter:
+    def __init__(self, routes, alpha=0.2, error_weight=4.0, bias=0.25, explore=0.02, stale_after=300.0,
+                 on_observe=None):
+        # routes: {frontend_model: [Route, ...]} in order of preference;
+        # on_observe(model, route) is called after each observation
+        self._routes = routes
+        self._alpha = alpha
+        self._error_weight = error_weight
+        self._bias = bias
+        self._explore = explore
+        self._stale_after = stale_after
+        self._on_observe = on_observe
+        self._lock = threading.Lock()
+
+    def routes(self, model):
+        return self._routes.get(model, [])
+
+    def order(self, model):
+        # Routes to try for one request, best first
+        routes = self._routes.get(model, [])
+        if len(routes) < 2:
+            return list(routes)
+        now = time.monotonic()
+        with self._lock:
+            seen = [r.score(self._error_weight) for r in routes if r.samples]
+            unseen = min(seen) if seen else 0.0
+            ranked = sorted(
+                range(len(routes)),
+                key=lambda i: (
+                    (routes[i].score(self._error_weight) if routes[i].samples else unseen) * (1 + self._bias * i),
+                    i,
+                ),
+            )
+            stale = [i for i in ranked[1:] if now - routes[i].last_seen > self._stale_after]
+        if stale and random.random() < self._explore:
+            first = random.choice(stale)
+            ranked.remove(first)
+            ranked.insert(0, first)
+        return [routes[i] for i in ranked]
+
+    def observe(self, model, route, latency=None, ok=True):
+        # latency: seconds to the first token, for a successful attempt
+        with self._lock:
+            a = self._alpha
+            if ok and latency is not None:
+                route.latency = latency if route.latency is None else (1 - a) * route.latency + a * latency
+            route.error_rate = (1 - a) * route.error_rate + (0.0 if ok else a)
+            route.samples += 1
+            route.last_seen = time.monotonic()
+        if self._on_observe is not None:
+            self._on_observe(model, route)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                model: [
+                    {
+                        "provider": r.provider,
+                        "backend": r.backend,
+                        "latency": None if r.latency is None else round(r.latency, 3),
+                        "error_rate": round(r.error_rate, 3),
+                        "samples": r.samples,
+                    }
+                    for r in routes
+                ]
+                for model, routes in self._routes.items()
+            }
+
+
+def load_routes(mapping, path=None, default_provider="PuterJS"):
+    # Every mapped model routes to its MODEL_MAPPING backend through the
+    # default provider. A JSON file can replace a model's list:
+    #   {"botintel-v4": [{"provider": "PuterJS", "model": "openrouter:openai/gpt-5.2"},
+    #                    {"provider": "OpenRouter", "model": "openai/gpt-5.2", "keyed": false}]}
+    routes = {model: [Route(default_provider, backend)] for model, backend in mapping.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        for model, entries in config.items():
+            if model not in mapping:
+                raise ValueError(f"Routes configured for unknown model: {model}")
+            routes[model] = [
+                Route(e["provider"], e.get("model", mapping[model]), e.get("keyed", e["provider"] == default_provider))
+                for e in entries
+            ]
+            if not routes[model]:
+                raise ValueError(f"No routes configured for {model}")
+    return routes
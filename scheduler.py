@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Priority scheduling of upstream calls. Each request is put in a class
+# (interactive chats, large-context chats, deep research, images); every class
+# has its own queue and concurrency limit, and all classes share a total
+# limit. When a slot frees up it goes to the waiting class with the smallest
+# virtual time, which advances by 1/weight per grant, so classes share the
+# upstream in proportion to their weights (start-time fair queuing). A class
+# that was idle restarts at the current virtual time rather than banking
+# credit, so a burst of research jobs cannot crowd out short chats.
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+class Waiter:
+    # Compared by identity, so a timed-out waiter removes only itself
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+
+class Scheduler:
+    def __init__(self, classes, total=32, max_queue=64, max_wait=30.0, on_wait=None):
+        # classes: {name: (weight, limit)}; on_wait(name, seconds, outcome)
+        self._weights = {name: float(weight) for name, (weight, _) in classes.items()}
+        self._limits = {name: limit for name, (_, limit) in classes.items()}
+        self._total = total
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        self._on_wait = on_wait
+        self._cond = threading.Condition()
+        self._queues = {name: deque() for name in classes}
+        self._running = dict.fromkeys(classes, 0)
+        self._vtime = dict.fromkeys(classes, 0.0)
+        self._clock = 0.0
+        self._in_use = 0
+
+    def acquire(self, name, timeout=None):
+        # Blocks until the class gets a slot; raises SchedulerBusy when its
+        # queue is full or the wait exceeds timeout (default max_wait).
+        timeout = self._max_wait if timeout is None else timeout
+        started = time.monotonic()
+        waiter = Waiter()
+        with self._cond:
+            queue = self._queues[name]
+            if len(queue) >= self._max_queue:
+                self._observe(name, 0.0, "rejected")
+                raise SchedulerBusy(f"Too many queued {name} requests")
+            if not queue:
+                self._vtime[name] = max(self._vtime[name], self._clock)
+            queue.append(waiter)
+            self._dispatch()
+            deadline = started + timeout
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(waiter)
+                    self._observe(name, time.monotonic() - started, "timeout")
+                    raise SchedulerBusy(f"Timed out waiting for an upstream slot ({name})")
+                self._cond.wait(remaining)
+        self._observe(name, time.monotonic() - started, "granted")
+
+    def release(self, name):
+        with self._cond:
+            self._running[name] -= 1
+            self._in_use -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, name, timeout=None):
+        self.acquire(name, timeout)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def stats(self):
+        with self._cond:
+            return {
+                name: {"running": self._running[name], "queued": len(queue), "limit": self._limits[name]}
+                for name, queue in self._queues.items()
+            }
+
+    def _dispatch(self):
+        # Called with the lock held; grants free slots to waiting classes
+        granted = False
+        while self._in_use < self._total:
+            best = None
+            for name, queue in self._queues.items():
+                if queue and self._running[name] < self._limits[name]:
+                    if best is None or self._vtime[name] < self._vtime[best]:
+                        best = name
+            if best is None:
+                break
+            self._queues[best].popleft().granted = True
+            self._running[best] += 1
+            self._in_use += 1
+            self._clock = self._vtime[best]
+            self._vtime[best] += 1.0 / self._weights[best]
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _observe(self, name, seconds, outcome):
+        if self._on_wait is not None:
+            self._on_wait(name, seconds, outcome)
+
+
+def parse_classes(spec):
+    # "interactive:8:32,bulk:2:8" -> {"interactive": (8.0, 32), "bulk": (2.0, 8)}
+    classes = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, weight, limit = part.split(":")
+        classes[name.strip()] = (float(weight), int(limit))
+    return classes
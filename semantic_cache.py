@@ -0,0 +1,203 @@
+import hashlib
+import heapq
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from response_cache import SAMPLING_PARAMS, entry_size
+
+# Near-duplicate cache for chat completions. A request's last user turn is
+# reduced to a bottom-k MinHash sketch: the k smallest CRC32 hashes of its
+# character n-grams after case, punctuation and whitespace are normalised.
+# Two sketches estimate the Jaccard similarity of the texts' n-gram sets, so
+# rephrasings that share most of their wording land close together.
+#
+# Only requests with the same model, sampling params and everything before
+# the last user turn (byte for byte) are compared, so "yes, please" in one
+# conversation never answers another; the numbers in the turn must match
+# too, so "2 + 2" and "2 + 3" stay apart. Within that namespace an inverted
+# index from sketch hash to entries finds the few entries sharing the most
+# hashes; the best one is served if its similarity reaches the threshold.
+#
+# This is lexical similarity, not meaning: "reverse a list" and "sort a list"
+# score high. Keep the threshold high, and use shadow mode (look up, don't
+# serve, compare answers) to measure hit quality before serving hits.
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+# Candidates checked exactly per lookup, by number of shared hashes
+CANDIDATES = 8
+
+
+def normalise(text):
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+def sketch(text, k=64, ngram=5):
+    # Sorted bottom-k hashes of the text's character n-grams
+    text = normalise(text)
+    if len(text) <= ngram:
+        return [zlib.crc32(text.encode("utf-8"))]
+    encoded = text.encode("utf-8")
+    shingles = {zlib.crc32(encoded[i:i + ngram]) for i in range(len(encoded) - ngram + 1)}
+    return heapq.nsmallest(k, shingles)
+
+
+def similarity(a, b, k=64):
+    # Jaccard estimate: how many of the union's k smallest hashes both share
+    if not a or not b:
+        return 0.0
+    a_set, b_set = set(a), set(b)
+    union = heapq.nsmallest(k, a_set | b_set)
+    return sum(1 for h in union if h in a_set and h in b_set) / len(union)
+
+
+def last_user_text(messages):
+    # (index, text) of the last user message, or (None, None)
+    for i in range(len(messages) - 1, -1, -1):
+        m = messages[i]
+        if isinstance(m, dict) and m.get("role") == "user":
+            content = m.get("content")
+            if isinstance(content, list):
+                content = " ".join(p.get("text") or "" for p in content if isinstance(p, dict))
+            return (i, content) if isinstance(content, str) else (None, None)
+    return None, None
+
+
+class Probe:
+    # One request's lookup key. After get(), `nearest` is the best candidate's
+    # similarity (None if there was none) and `match` the hit, if any.
+    __slots__ = ("model", "namespace", "sketch", "nearest", "match")
+
+    def __init__(self, model, namespace, sketch):
+        self.model = model
+        self.namespace = namespace
+        self.sketch = sketch
+        self.nearest = None
+        self.match = None
+
+
+class Match:
+    __slots__ = ("chunks", "similarity")
+
+    def __init__(self, chunks, similarity):
+        self.chunks = chunks
+        self.similarity = similarity
+
+
+class _Entry:
+    __slots__ = ("namespace", "sketch", "chunks", "size", "expires_at")
+
+    def __init__(self, namespace, sketch, chunks, size, expires_at):
+        self.namespace = namespace
+        self.sketch = sketch
+        self.chunks = chunks
+        self.size = size
+        self.expires_at = expires_at
+
+
+class SemanticCache:
+    def __init__(self, models, threshold=0.9, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=3600.0,
+                 min_chars=16, max_chars=4000, k=64, ngram=5, on_evict=None):
+        # on_evict("memory", count), if given, reports entries evicted for size
+        self.models = frozenset(models)
+        self.threshold = threshold
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._min_chars = min_chars
+        self._max_chars = max_chars
+        self._k = k
+        self._ngram = ngram
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # id -> _Entry, least recently used first
+        self._postings = {}  # (namespace, hash) -> set of ids
+        self._bytes = 0
+        self._next_id = 0
+        self._on_evict = on_evict
+
+    def probe(self, model, messages, data):
+        # None when the request isn't a candidate: model not enabled, or no
+        # last user turn of a length worth comparing
+        if model not in self.models:
+            return None
+        index, text = last_user_text(messages)
+        if text is None or not self._min_chars <= len(text) <= self._max_chars:
+            return None
+        params = {name: data[name] for name in SAMPLING_PARAMS if name in data}
+        context = json.dumps(
+            {"model": model, "context": messages[:index], "params": params,
+             "numbers": sorted(set(_NUMBER.findall(text)))},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+        )
+        namespace = hashlib.sha256(context.encode("utf-8")).hexdigest()[:32]
+        return Probe(model, namespace, sketch(text, self._k, self._ngram))
+
+    def get(self, probe):
+        # Best Match at or above the threshold, else None
+        now = time.time()
+        with self._lock:
+            shared = Counter()
+            for h in probe.sketch:
+                ids = self._postings.get((probe.namespace, h))
+                if ids:
+                    shared.update(ids)
+            best = None
+            for entry_id, _ in shared.most_common(CANDIDATES):
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now:
+                    self._remove(entry_id)
+                    continue
+                score = similarity(probe.sketch, entry.sketch, self._k)
+                if best is None or score > best[1]:
+                    best = (entry_id, score)
+            if best is None:
+                return None
+            entry_id, score = best
+            probe.nearest = score
+            if score < self.threshold:
+                return None
+            self._entries.move_to_end(entry_id)
+            probe.match = Match(self._entries[entry_id].chunks, score)
+            return probe.match
+
+    def put(self, probe, chunks):
+        chunks = list(chunks)
+        size = entry_size(chunks)
+        if size > self._max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(probe.namespace, probe.sketch, chunks, size, time.time() + self._ttl)
+            for h in probe.sketch:
+                self._postings.setdefault((probe.namespace, h), set()).add(entry_id)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted and self._on_evict is not None:
+            self._on_evict("memory", evicted)
+
+    def agreement(self, cached_chunks, fresh_chunks):
+        # How close a cached answer is to a fresh one for the same request
+        cached = "".join(c for c in cached_chunks if c)
+        fresh = "".join(c for c in fresh_chunks if c)
+        return similarity(sketch(cached, self._k, self._ngram), sketch(fresh, self._k, self._ngram), self._k)
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        self._bytes -= entry.size
+        for h in entry.sketch:
+            key = (entry.namespace, h)
+            ids = self._postings.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._postings[key]
@@ -0,0 +1,168 @@
+import threading
+
+# Request coalescing: concurrent identical requests share one upstream call.
+# The first caller for a key starts the producer on a background thread; every
+# caller (including the first) subscribes to the flight and receives each item
+# as it is published. Late joiners replay the buffered prefix first. A flight
+# is forgotten as soon as it finishes, so later requests start a new one. A
+# streaming flight whose subscribers have all gone (clients disconnected) is
+# abandoned: the producer is closed so it can release its upstream.
+#
+# The leader may attach a context to its flight (the app passes its request
+# recorder); on_follow(context) then runs for each follower once it is done
+# with the flight, so followers can report what served them.
+
+
+class Flight:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.context = None
+        self.cond = threading.Condition()
+
+    def publish(self, item):
+        with self.cond:
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def subscribe(self, on_close=None):
+        return Subscription(self, on_close)
+
+
+class Subscription:
+    # One subscriber's iterator over a flight. It leaves the flight exactly
+    # once, when the items run out or on close(), even if iteration never
+    # started (a client gone before its response body was read).
+
+    def __init__(self, flight, on_close=None):
+        self._flight = flight
+        self._on_close = on_close
+        self._index = 0
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        flight = self._flight
+        with flight.cond:
+            while self._index >= len(flight.items) and not flight.done:
+                flight.cond.wait()
+            if self._index < len(flight.items):
+                self._index += 1
+                return flight.items[self._index - 1]
+            error = flight.error
+        self.close()
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._flight.cond:
+            self._flight.subscribers -= 1
+        if self._on_close is not None:
+            self._on_close()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.started = 0
+        self.joined = 0
+
+    def _join(self, key, context):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                flight.context = context
+                self._flights[key] = flight
+                self.started += 1
+            else:
+                self.joined += 1
+            with flight.cond:
+                flight.subscribers += 1
+        return flight, leader
+
+    def _forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _abandon(self, key, flight):
+        # Forget a flight nobody is subscribed to; _join holds the same lock,
+        # so no one can join while this decides.
+        with self._lock:
+            with flight.cond:
+                if flight.subscribers > 0:
+                    return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return True
+
+    def _follower_hook(self, flight, leader, on_follow):
+        if leader or on_follow is None:
+            return None
+        return lambda: on_follow(flight.context)
+
+    def stream(self, key, producer, context=None, on_follow=None):
+        # producer: zero-argument callable returning an iterator of items
+        flight, leader = self._join(key, context)
+        if leader:
+            def run():
+                items = None
+                try:
+                    items = producer()
+                    for item in items:
+                        flight.publish(item)
+                        if flight.subscribers <= 0 and self._abandon(key, flight):
+                            break
+                except Exception as e:
+                    self._forget(key, flight)
+                    flight.finish(e)
+                else:
+                    self._forget(key, flight)
+                    flight.finish()
+                finally:
+                    close = getattr(items, "close", None)
+                    if callable(close):
+                        close()
+
+            threading.Thread(target=run, name="singleflight", daemon=True).start()
+        return flight.subscribe(self._follower_hook(flight, leader, on_follow))
+
+    def call(self, key, fn, context=None, on_follow=None):
+        # Non-streaming variant: the leader runs fn inline and every caller
+        # gets its return value (or exception).
+        flight, leader = self._join(key, context)
+        if leader:
+            try:
+                flight.publish(fn())
+            except Exception as e:
+                self._forget(key, flight)
+                flight.finish(e)
+            else:
+                self._forget(key, flight)
+                flight.finish()
+        items = flight.subscribe(self._follower_hook(flight, leader, on_follow))
+        try:
+            for result in items:
+                return result
+        finally:
+            items.close()
+        raise RuntimeError("coalesced call finished without a result")
@@ -0,0 +1,76 @@
+import json
+import time
+from json.encoder import encode_basestring_ascii
+
+# Server-sent event framing for chat completion chunks. Every content frame
+# has the same JSON shape, so the surrounding text is rendered once and only
+# the escaped content string is spliced in per delta. The output is
+# byte-identical to json.dumps() of the equivalent chunk dict.
+
+DELTA_PREFIX = 'data: {"choices": [{"delta": {"content": '
+DELTA_SUFFIX = '}, "index": 0, "finish_reason": null}]}\n\n'
+
+
+def sse_delta(content):
+    return DELTA_PREFIX + encode_basestring_ascii(content) + DELTA_SUFFIX
+
+
+def sse_chunk(content, finish_reason=None):
+    if finish_reason is None and isinstance(content, str):
+        return sse_delta(content)
+    data = {
+        "choices": [
+            {
+                "delta": {"content": content},
+                "index": 0,
+                "finish_reason": finish_reason
+            }
+        ]
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+class DeltaBatcher:
+    # Coalesces token deltas into one frame until flush_interval seconds have
+    # passed since the frame was started or max_bytes of content are pending.
+    # With both limits at 0 every delta is its own frame. Empty deltas are
+    # dropped either way. add() can only check the time bound when a delta
+    # arrives, so callers wake up at flush_at() and flush() when the
+    # upstream pauses.
+
+    def __init__(self, flush_interval=0.0, max_bytes=0, clock=time.monotonic):
+        self._flush_interval = flush_interval
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._pending = []
+        self._pending_len = 0
+        self._started = 0.0
+
+    def add(self, content):
+        if not content:
+            return None
+        if not self._flush_interval and not self._max_bytes:
+            return sse_delta(content)
+        if not self._pending:
+            self._started = self._clock()
+        self._pending.append(content)
+        self._pending_len += len(content)
+        if (self._max_bytes and self._pending_len >= self._max_bytes) or (
+            self._flush_interval and self._clock() - self._started >= self._flush_interval
+        ):
+            return self.flush()
+        return None
+
+    def flush_at(self):
+        # When pending content is due out (clock time), or None
+        if not self._pending or not self._flush_interval:
+            return None
+        return self._started + self._flush_interval
+
+    def flush(self):
+        if not self._pending:
+            return None
+        frame = sse_delta("".join(self._pending))
+        self._pending = []
+        self._pending_len = 0
+        return frame
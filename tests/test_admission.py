@@ -0,0 +1,50 @@
+import pytest
+
+from admission import Admission, MemoryStore, Rejected, SqliteStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryStore() if request.param == "memory" else SqliteStore(str(tmp_path / "admission.db"))
+
+
+def test_consumer_burst_then_rejection(store):
+    admission = Admission(store, consumer_rate=1.0, consumer_burst=2, model_rate=0)
+    admission.admit("a", "m")
+    admission.admit("a", "m")
+    with pytest.raises(Rejected) as rejected:
+        admission.admit("a", "m")
+    assert rejected.value.retry_after == 1
+    admission.admit("b", "m")  # Other consumers have their own bucket
+
+
+def test_model_bucket_is_shared(store):
+    admission = Admission(store, consumer_rate=0, model_rate=1.0, model_burst=1)
+    admission.admit("a", "m")
+    with pytest.raises(Rejected):
+        admission.admit("b", "m")
+
+
+def test_in_flight_cap_and_release(store):
+    admission = Admission(store, max_in_flight=1, max_wait=0.05, max_waiters=1)
+    slot = admission.acquire()
+    with pytest.raises(Rejected):
+        admission.acquire()
+    admission.release(slot)
+    admission.release(admission.acquire())
+
+
+def test_expired_slot_leases_are_reclaimed(store):
+    admission = Admission(store, max_in_flight=1, max_wait=0, slot_lease=0.0)
+    admission.acquire()
+    admission.acquire()  # The first lease has already expired
+
+
+def test_refilled_buckets_are_pruned():
+    store = MemoryStore()
+    admission = Admission(store, consumer_rate=1000.0, consumer_burst=1, model_rate=0, prune_interval=0)
+    for consumer in range(50):
+        admission.admit(consumer, "m")
+    store._buckets = {key: (tokens, updated - 1) for key, (tokens, updated) in store._buckets.items()}
+    admission.admit("new", "m")
+    assert list(store._buckets) == ["consumer:new"]
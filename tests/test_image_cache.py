@@ -0,0 +1,27 @@
+import hashlib
+import io
+import os
+import time
+import urllib.request
+
+from image_cache import ImageCache
+
+
+def test_eviction_sweeps_key_files_of_evicted_blobs(tmp_path, monkeypatch):
+    def body(url):
+        return url.encode() * 100  # 1600 bytes
+    monkeypatch.setattr(urllib.request, "urlopen", lambda url, timeout=None: io.BytesIO(body(url)))
+    evicted = []
+    cache = ImageCache(blob_dir=str(tmp_path), max_bytes=3500, on_evict=lambda tier, count: evicted.append((tier, count)))
+    keys = [f"{n:064x}" for n in range(3)]
+    for n, key in enumerate(keys):
+        url = f"http://img/{n}.png"
+        cache.put(key, url)
+        # Older blobs are less recently used
+        stamp = time.time() - 10 + n
+        os.utime(cache._blob_path(hashlib.sha256(body(url)).hexdigest()), (stamp, stamp))
+
+    assert sorted(os.listdir(tmp_path / "keys")) == keys[1:]
+    assert evicted == [("disk", 1)]
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
@@ -0,0 +1,29 @@
+from key_pool import CLOSED, OPEN, KeyPool, classify_failure
+
+
+class ResponseStatusError(Exception):
+    pass
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_classify_failure():
+    assert classify_failure(RateLimitError("Response 504: Gateway Timeout")) == "rate_limited"
+    assert classify_failure(ResponseStatusError("Response 429: slow down")) == "rate_limited"
+    assert classify_failure(ResponseStatusError("Response 401: bad key")) == "unauthorized"
+    assert classify_failure(ResponseStatusError("Response 400: messages too long")) == "request"
+    assert classify_failure(ResponseStatusError("Response 502: Bad Gateway")) == "error"
+    # Status codes elsewhere in the text are not statuses
+    assert classify_failure(RuntimeError("model returned 401 tokens, retry 429 later")) == "error"
+
+
+def test_request_errors_leave_keys_healthy():
+    pool = KeyPool(["a", "b"], failure_threshold=1)
+    for _ in range(3):
+        for key in pool.candidates():
+            assert pool.report_failure(key, ResponseStatusError("Response 400: invalid payload")) == "request"
+    assert [s["state"] for s in pool.snapshot()] == [CLOSED, CLOSED]
+    pool.report_failure("a", ResponseStatusError("Response 500: oops"))
+    assert [s["state"] for s in pool.snapshot()] == [OPEN, CLOSED]
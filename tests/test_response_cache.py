@@ -0,0 +1,22 @@
+import os
+import threading
+
+from response_cache import ResponseCache
+
+
+def test_disk_sweep_runs_off_the_storing_thread(tmp_path):
+    evicted = []
+    swept = threading.Event()
+
+    def on_evict(tier, count):
+        evicted.append((tier, count, threading.current_thread().name))
+        if tier == "disk":
+            swept.set()
+
+    cache = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=0, on_evict=on_evict)
+    cache.put("a", ["hello"])
+
+    assert swept.wait(5)
+    assert evicted == [("disk", 1, "response-cache-sweep")]
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert cache.get("a") == ["hello"]  # Still in memory
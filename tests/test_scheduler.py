@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import Scheduler, SchedulerBusy, parse_classes
+
+
+def grant_order(scheduler, waiting):
+    # Queue `waiting` (class names, in order) behind a held slot, then free
+    # it and return the order in which the waiters were granted
+    scheduler.acquire("hold")
+    order = []
+    lock = threading.Lock()
+
+    def run(name):
+        scheduler.acquire(name)
+        with lock:
+            order.append(name)
+        scheduler.release(name)
+
+    threads = []
+    for name in waiting:
+        queued = scheduler.stats()[name]["queued"]
+        thread = threading.Thread(target=run, args=(name,))
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 2
+        while scheduler.stats()[name]["queued"] == queued:
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+    scheduler.release("hold")
+    for thread in threads:
+        thread.join(2)
+    return order
+
+
+def test_slots_are_shared_in_proportion_to_weight():
+    scheduler = Scheduler({"hold": (1, 1), "interactive": (3, 10), "bulk": (1, 10)}, total=1)
+    order = grant_order(scheduler, ["bulk"] * 6 + ["interactive"] * 6)
+    assert order[:8].count("interactive") == 6
+    assert order[:8].count("bulk") == 2
+
+
+def test_idle_class_does_not_bank_credit():
+    scheduler = Scheduler({"hold": (1, 1), "interactive": (1, 10), "research": (1, 10)}, total=1)
+    # Research runs alone for a while, then chats arrive: they interleave
+    # with research instead of research being starved to catch up
+    for _ in range(5):
+        with scheduler.slot("interactive"):
+            pass
+    order = grant_order(scheduler, ["research"] * 4 + ["interactive"] * 4)
+    assert order[:4].count("research") == 2
+
+
+def test_class_limit_caps_concurrency():
+    scheduler = Scheduler({"research": (1, 1), "interactive": (1, 4)}, total=4, max_wait=0.05)
+    scheduler.acquire("research")
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire("research")
+    with scheduler.slot("interactive"):
+        pass
+
+
+def test_full_queue_is_rejected():
+    scheduler = Scheduler({"interactive": (1, 1)}, total=1, max_queue=1, max_wait=2)
+    scheduler.acquire("interactive")
+    waiting = threading.Thread(target=scheduler.acquire, args=("interactive",))
+    waiting.start()
+    deadline = time.monotonic() + 2
+    while scheduler.stats()["interactive"]["queued"] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire("interactive")
+    scheduler.release("interactive")
+    waiting.join(2)
+
+
+def test_parse_classes():
+    assert parse_classes("interactive:8:32, bulk:2:8") == {"interactive": (8.0, 32), "bulk": (2.0, 8)}
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+class Producer:
+    # Items released one at a time with step(), so tests control the flight
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+        self.closed = threading.Event()
+        self.steps = threading.Semaphore(0)
+
+    def __call__(self):
+        self.calls += 1
+        return self._run()
+
+    def _run(self):
+        try:
+            for item in self.items:
+                if not self.steps.acquire(timeout=2):
+                    return
+                yield item
+        finally:
+            self.closed.set()
+
+    def step(self, count=1):
+        for _ in range(count):
+            self.steps.release()
+
+
+def test_late_joiner_replays_the_prefix_then_follows():
+    flights = SingleFlight()
+    producer = Producer(["a", "b", "c", "d"])
+    first = flights.stream("k", producer)
+    producer.step(2)
+    assert [next(first), next(first)] == ["a", "b"]
+
+    late = flights.stream("k", producer)
+    producer.step(2)
+    assert list(late) == ["a", "b", "c", "d"]
+    assert list(first) == ["c", "d"]
+    assert producer.calls == 1
+    assert (flights.started, flights.joined) == (1, 1)
+
+
+def test_finished_flight_is_forgotten():
+    flights = SingleFlight()
+    producer = Producer(["a"])
+    producer.step()
+    assert list(flights.stream("k", producer)) == ["a"]
+    producer.step()
+    assert list(flights.stream("k", producer)) == ["a"]
+    assert producer.calls == 2
+
+
+def test_flight_is_abandoned_when_every_subscriber_leaves():
+    flights = SingleFlight()
+    producer = Producer(["a", "b", "c"])
+    first = flights.stream("k", producer)
+    second = flights.stream("k", producer)
+    producer.step()
+    assert next(first) == "a"
+    first.close()
+    second.close()  # Closed before its first item
+    producer.step()
+    # Abandoned at the next item, well before the producer would give up
+    assert producer.closed.wait(0.5)
+    fresh = Producer(["x"])
+    fresh.step()
+    assert list(flights.stream("k", fresh)) == ["x"]
+
+
+def test_followers_report_the_leader_context():
+    flights = SingleFlight()
+    producer = Producer(["a"])
+    followed = []
+    leader = flights.stream("k", producer, "leader", followed.append)
+    follower = flights.stream("k", producer, "follower", followed.append)
+    producer.step()
+    assert list(leader) == ["a"]
+    assert followed == []
+    assert list(follower) == ["a"]
+    assert followed == ["leader"]
+
+
+def test_producer_errors_reach_every_subscriber():
+    flights = SingleFlight()
+
+    def producer():
+        yield "a"
+        raise RuntimeError("upstream failed")
+
+    items = flights.stream("k", producer)
+    assert next(items) == "a"
+    with pytest.raises(RuntimeError):
+        next(items)
+
+
+def test_call_shares_one_result():
+    flights = SingleFlight()
+    entered = threading.Event()
+    proceed = threading.Event()
+    calls = []
+    followed = []
+
+    def fn():
+        calls.append(1)
+        entered.set()
+        proceed.wait(2)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.call("k", fn, "leader", followed.append)))
+    leader.start()
+    assert entered.wait(2)
+    follower = threading.Thread(target=lambda: results.append(flights.call("k", fn, "follower", followed.append)))
+    follower.start()
+    wait_for(lambda: flights.joined == 1)
+    proceed.set()
+    leader.join(2)
+    follower.join(2)
+    assert results == ["result", "result"]
+    assert calls == [1]
+    assert followed == ["leader"]
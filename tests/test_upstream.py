@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from upstream import DeadlineExceeded, EmptyCompletion, Hedger, Timeouts, UpstreamTimeout, follow, race_first_item
+
+release = threading.Event()
+
+
+@pytest.fixture(autouse=True)
+def release_hung_streams():
+    release.clear()
+    yield
+    release.set()
+
+
+def stream_factory(delays):
+    # open_stream for keys that wait delays[key] seconds (None: until the
+    # test ends) before yielding "<key>-1" and "<key>-2"
+    def open_stream(api_key):
+        delay = delays[api_key]
+        release.wait(delay)
+        if delay is None or release.is_set():
+            return
+        yield f"{api_key}-1"
+        yield f"{api_key}-2"
+    return open_stream
+
+
+def race(delays, keys, hedger=None, timeouts=None, deadline=None):
+    started, failures = [], []
+    won = race_first_item(
+        iter(keys), stream_factory(delays), hedger or Hedger(),
+        started.append, lambda key, e: failures.append((key, e)), timeouts, deadline,
+    )
+    return won, started, failures
+
+
+def test_first_key_wins_without_hedging():
+    (events, attempt, first), started, failures = race({"a": 0, "b": 0}, ["a", "b"])
+    assert (attempt.api_key, first) == ("a", "a-1")
+    assert list(follow(events, attempt)) == ["a-2"]
+    assert started == ["a"] and failures == []
+
+
+def test_hedge_wins_when_first_attempt_is_slow():
+    hedger = Hedger(enabled=True, delay=0.05, max_fraction=1.0)
+    (_, attempt, first), started, _ = race({"slow": None, "fast": 0}, ["slow", "fast"], hedger)
+    assert (attempt.api_key, first) == ("fast", "fast-1")
+    assert started == ["slow", "fast"]
+    assert (hedger.hedges, hedger.hedge_wins) == (1, 1)
+
+
+def test_hedge_loses_to_the_original_attempt():
+    hedger = Hedger(enabled=True, delay=0.05, max_fraction=1.0)
+    (_, attempt, _), started, _ = race({"slow": 0.15, "slower": None}, ["slow", "slower"], hedger)
+    assert attempt.api_key == "slow"
+    assert started == ["slow", "slower"]
+    assert (hedger.hedges, hedger.hedge_wins) == (1, 0)
+
+
+def test_hedges_are_limited_by_the_budget():
+    # Each request earns a tenth of a hedge, so the first request can't hedge
+    hedger = Hedger(enabled=True, delay=0.05, max_fraction=0.1)
+    (_, attempt, _), started, _ = race({"slow": 0.15, "fast": 0}, ["slow", "fast"], hedger)
+    assert attempt.api_key == "slow"
+    assert started == ["slow"]
+    assert hedger.hedges == 0
+
+
+def test_attempt_timeout_fails_over_to_the_next_key():
+    timeouts = Timeouts(connect=0.05, first_token=0.1, idle=1, total=0)
+    (_, attempt, first), started, failures = race({"hung": None, "ok": 0}, ["hung", "ok"], timeouts=timeouts)
+    assert (attempt.api_key, first) == ("ok", "ok-1")
+    assert started == ["hung", "ok"]
+    assert [key for key, _ in failures] == ["hung"]
+    assert isinstance(failures[0][1], UpstreamTimeout)
+
+
+def test_errors_fail_over_to_the_next_key():
+    def open_stream(api_key):
+        if api_key == "bad":
+            raise RuntimeError("429")
+        yield "ok"
+    failures = []
+    _, attempt, first = race_first_item(
+        iter(["bad", "good"]), open_stream, Hedger(), lambda key: None, lambda key, e: failures.append(key)
+    )
+    assert (attempt.api_key, first) == ("good", "ok")
+    assert failures == ["bad"]
+
+
+def test_empty_stream_fails_over_to_the_next_key():
+    def open_stream(api_key):
+        if api_key == "good":
+            yield "ok"
+        else:
+            yield None  # A heartbeat, then nothing
+    failures = []
+    _, attempt, first = race_first_item(
+        iter(["empty", "good"]), open_stream, Hedger(), lambda key: None, lambda key, e: failures.append((key, e))
+    )
+    assert (attempt.api_key, first) == ("good", "ok")
+    assert [key for key, _ in failures] == ["empty"]
+    assert isinstance(failures[0][1], EmptyCompletion)
+
+
+def test_no_winner_when_keys_run_out():
+    timeouts = Timeouts(connect=0.05, first_token=0.05, idle=1, total=0)
+    won, _, failures = race({"a": None, "b": None}, ["a", "b"], timeouts=timeouts)
+    assert won is None
+    assert [key for key, _ in failures] == ["a", "b"]
+
+
+def test_deadline_ends_the_race():
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        race({"a": None, "b": None}, ["a", "b"], timeouts=Timeouts(total=0), deadline=started + 0.1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_follow_times_out_an_idle_stream():
+    def open_stream(api_key):
+        yield "first"
+        release.wait()
+    events, attempt, first = race_first_item(iter(["a"]), open_stream, Hedger(), lambda k: None, lambda k, e: None)
+    assert first == "first"
+    with pytest.raises(UpstreamTimeout):
+        list(follow(events, attempt, Timeouts(idle=0.05)))
+
+
+def test_follow_raises_at_the_deadline():
+    def open_stream(api_key):
+        yield "first"
+        while not release.is_set():
+            yield None  # Heartbeats keep the idle timeout from firing
+            time.sleep(0.01)
+    events, attempt, _ = race_first_item(iter(["a"]), open_stream, Hedger(), lambda k: None, lambda k, e: None)
+    with pytest.raises(DeadlineExceeded):
+        list(follow(events, attempt, Timeouts(idle=1), deadline=time.monotonic() + 0.1))
+
+
+def test_follow_ticks_while_the_stream_is_quiet():
+    def open_stream(api_key):
+        yield "a"
+        release.wait(0.2)
+        yield "b"
+    events, attempt, _ = race_first_item(iter(["k"]), open_stream, Hedger(), lambda k: None, lambda k, e: None)
+    tick = time.monotonic() + 0.05
+    items = follow(events, attempt, tick_at=lambda: tick)
+    assert next(items) is None
+    tick = None
+    assert list(items) == ["b"]
@@ -0,0 +1,28 @@
+# Cheap token estimates for when the upstream does not report usage. Roughly
+# four characters per token for English text, which is close enough for
+# accounting and budgeting without shipping a tokenizer.
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_tokens_for_chars(chars):
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(messages):
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        total += 4  # role and framing overhead per message
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        elif isinstance(content, list):
+            # Content parts: only text parts are counted
+            total += sum(estimate_tokens(p.get("text")) for p in content if isinstance(p, dict))
+    return total
@@ -0,0 +1,301 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# Upstream streams run on background threads and report into a queue, so the
+# request thread can wait on several attempts at once (hedging) and give up on
+# one without blocking on it.
+#
+# Timeouts bound each attempt: `connect` until the upstream sends anything
+# (streams yield None for chunks without content, as a heartbeat),
+# `first_token` until the first content, and `idle` between chunks once
+# streaming. An attempt that misses one fails like any other error, so the
+# next key takes over, as does one that finishes without any content. `total` is the deadline for the whole request, across
+# every key and route; past it DeadlineExceeded is raised.
+
+ITEM = "item"
+DONE = "done"
+ERROR = "error"
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class EmptyCompletion(Exception):
+    pass
+
+
+class Timeouts:
+    __slots__ = ("connect", "first_token", "idle", "total")
+
+    def __init__(self, connect=15.0, first_token=90.0, idle=60.0, total=300.0):
+        # Seconds; 0 disables a limit
+        self.connect = connect
+        self.first_token = first_token
+        self.idle = idle
+        self.total = total
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Timeouts(**values)
+
+    def deadline(self, started):
+        return started + self.total if self.total else None
+
+
+def parse_timeouts(spec, default):
+    # "botintel-dr:total=1800:first_token=600;botintel-v4:total=120"
+    # -> {"botintel-dr": Timeouts(...), "botintel-v4": Timeouts(...)}
+    timeouts = {}
+    for entry in spec.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, *fields = entry.split(":")
+        changes = {}
+        for field in fields:
+            name, value = field.split("=")
+            if name.strip() not in Timeouts.__slots__:
+                raise ValueError(f"Unknown timeout {name!r} for {model}")
+            changes[name.strip()] = float(value)
+        timeouts[model.strip()] = default.replace(**changes)
+    return timeouts
+
+
+class StreamAttempt:
+    def __init__(self, api_key, open_stream, events):
+        self.api_key = api_key
+        self.started_at = time.monotonic()
+        self.connected_at = None
+        self.first_item_at = None
+        self.last_activity = self.started_at
+        self._open_stream = open_stream
+        self._events = events
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._pump, name="upstream-attempt", daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        stream = None
+        try:
+            stream = self._open_stream(self.api_key)
+            for item in stream:
+                if self._cancelled.is_set():
+                    break
+                self.last_activity = time.monotonic()
+                if self.connected_at is None:
+                    self.connected_at = self.last_activity
+                if item is not None:
+                    self._events.put((self, ITEM, item))
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self._events.put((self, ERROR, e))
+            return
+        finally:
+            close = getattr(stream, "close", None)
+            if self._cancelled.is_set() and callable(close):
+                try:
+                    close()
+                except Exception:
+                    pass
+        if not self._cancelled.is_set():
+            self._events.put((self, DONE, None))
+
+    def cancel(self):
+        # The pump closes the upstream stream at its next chunk
+        self._cancelled.set()
+
+    def expired(self, timeouts, now):
+        # Why this attempt should be abandoned before its first item, if so
+        if timeouts is None:
+            return None
+        if timeouts.connect and self.connected_at is None and now - self.started_at > timeouts.connect:
+            return f"no response within {timeouts.connect:g}s"
+        if timeouts.first_token and now - self.started_at > timeouts.first_token:
+            return f"no content within {timeouts.first_token:g}s"
+        return None
+
+    def next_expiry(self, timeouts):
+        if timeouts is None:
+            return None
+        limits = []
+        if timeouts.connect and self.connected_at is None:
+            limits.append(self.started_at + timeouts.connect)
+        if timeouts.first_token:
+            limits.append(self.started_at + timeouts.first_token)
+        return min(limits) if limits else None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class Hedger:
+    # Policy for hedged requests: if the first attempt has produced nothing
+    # after `delay` seconds (or the observed TTFT quantile when delay is None),
+    # a second attempt starts on the next key. Each request earns
+    # `max_fraction` of a hedge token and each hedge spends one, so hedges
+    # never exceed that fraction of requests over time.
+
+    def __init__(self, enabled=False, delay=None, quantile=0.9, max_fraction=0.1,
+                 window=500, min_samples=20, default_delay=3.0, max_tokens=10.0):
+        self.enabled = enabled
+        self._delay = delay
+        self._quantile = quantile
+        self._max_fraction = max_fraction
+        self._min_samples = min_samples
+        self._default_delay = default_delay
+        self._max_tokens = max_tokens
+        self._tokens = 0.0
+        self._ttfts = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def note_request(self):
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._max_fraction)
+
+    def record_ttft(self, seconds):
+        with self._lock:
+            self._ttfts.append(seconds)
+
+    def hedge_delay(self):
+        if self._delay is not None:
+            return self._delay
+        with self._lock:
+            if len(self._ttfts) < self._min_samples:
+                return self._default_delay
+            ordered = sorted(self._ttfts)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self._quantile))]
+
+    def allow_hedge(self):
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            self.hedges += 1
+            return True
+
+    def record_win(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+
+def earliest(*times):
+    times = [t for t in times if t is not None]
+    return min(times) if times else None
+
+
+def race_first_item(keys, open_stream, hedger, on_start, on_failure, timeouts=None, deadline=None):
+    # Start attempts from the `keys` iterator until one yields its first item.
+    # Failed or timed-out attempts are reported and replaced by the next key;
+    # with hedging enabled a slow attempt gets a concurrent competitor.
+    # Returns (events, winner, first_item) with losers cancelled, or None when
+    # keys run out; raises DeadlineExceeded at `deadline` (monotonic). Streams
+    # yield None only as heartbeats, and one that finishes without an item
+    # fails with EmptyCompletion, so first_item is never None.
+    events = queue.Queue()
+    active = []
+
+    def launch():
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        api_key = next(keys, None)
+        if api_key is None:
+            return False
+        on_start(api_key)
+        active.append(StreamAttempt(api_key, open_stream, events))
+        return True
+
+    def fail(attempt, error):
+        active.remove(attempt)
+        on_failure(attempt.api_key, error)
+
+    if not launch():
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return None
+    hedger.note_request()
+    hedge = None
+    hedge_at = time.monotonic() + hedger.hedge_delay() if hedger.enabled else None
+
+    while active:
+        wake = earliest(hedge_at, deadline, *(a.next_expiry(timeouts) for a in active))
+        try:
+            attempt, kind, value = events.get(timeout=None if wake is None else max(0.0, wake - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                for other in active:
+                    other.cancel()
+                raise DeadlineExceeded("Request deadline exceeded")
+            for other in list(active):
+                reason = other.expired(timeouts, now)
+                if reason:
+                    other.cancel()
+                    fail(other, UpstreamTimeout(reason))
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                if hedger.allow_hedge() and launch():
+                    hedge = active[-1]
+            if not active and launch():
+                hedge_at = time.monotonic() + hedger.hedge_delay() if hedger.enabled else None
+            continue
+        if attempt not in active:
+            continue
+        if kind != ITEM:
+            fail(attempt, value if kind == ERROR else EmptyCompletion("upstream returned no content"))
+            if not active and launch():
+                hedge_at = time.monotonic() + hedger.hedge_delay() if hedger.enabled else None
+            continue
+
+        for other in active:
+            if other is not attempt:
+                other.cancel()
+        attempt.first_item_at = time.monotonic()
+        hedger.record_ttft(attempt.first_item_at - attempt.started_at)
+        hedger.record_win(attempt is hedge)
+        return events, attempt, value
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return None
+
+
+def follow(events, attempt, timeouts=None, deadline=None, tick_at=None):
+    # Remaining items of the winning attempt; raises its error if it fails
+    # mid-stream, UpstreamTimeout when it goes quiet for longer than the idle
+    # timeout, and DeadlineExceeded at `deadline`. tick_at(), if given,
+    # returns a monotonic time (or None) at which the caller wants control
+    # back even without an item; None is yielded then.
+    idle = timeouts.idle if timeouts is not None else 0
+    while True:
+        tick = tick_at() if tick_at is not None else None
+        wake = earliest(attempt.last_activity + idle if idle else None, deadline, tick)
+        try:
+            source, kind, value = events.get(timeout=None if wake is None else max(0.0, wake - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise DeadlineExceeded("Request deadline exceeded")
+            if idle and now - attempt.last_activity > idle:
+                raise UpstreamTimeout(f"stream idle for {idle:g}s")
+            if tick is not None and now >= tick:
+                yield None
+            continue
+        if source is not attempt:
+            continue
+        if kind == ITEM:
+            yield value
+        elif kind == ERROR:
+            raise value
+        else:
+            return
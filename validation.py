@@ -0,0 +1,102 @@
+from typing import Annotated, Literal, Optional, Union
+
+import msgspec
+
+# Request parsing for the chat and image routes, done before any other work.
+# Oversized bodies are refused from their Content-Length (or once reading
+# passes the limit) without being parsed. Accepted bodies are decoded by
+# msgspec's JSON decoder and checked against the typed structs below; the
+# handlers keep using the decoded dict, so fields the structs don't name
+# (sampling params, "pinned", tool calls) pass through untouched. Type errors
+# name the offending field ("... - at `$.messages[2].content`") and come
+# back as 400s; bodies, message counts and message lengths over their
+# limits come back as 413s.
+
+ROLES = Literal["system", "developer", "user", "assistant", "tool", "function"]
+
+
+class InvalidRequest(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ContentPart(msgspec.Struct):
+    type: str
+    text: Optional[str] = None
+
+
+class Message(msgspec.Struct):
+    role: ROLES
+    content: Union[str, list[ContentPart], None] = None
+
+
+class ChatRequest(msgspec.Struct):
+    model: str
+    messages: Annotated[list[Message], msgspec.Meta(min_length=1)]
+    stream: Optional[bool] = None
+
+
+class ImageRequest(msgspec.Struct):
+    prompt: str
+    model: str = "botintel-image"
+    size: Optional[str] = None
+    quality: Optional[str] = None
+    style: Optional[str] = None
+    n: Optional[int] = None
+    callback_url: Optional[str] = None
+
+
+def content_length(content):
+    if isinstance(content, str):
+        return len(content)
+    if content:
+        return sum(len(part.text) for part in content if part.text)
+    return 0
+
+
+class RequestValidator:
+    def __init__(self, max_bytes=8 * 1024 * 1024, max_messages=1000, max_message_chars=1000000):
+        self.max_bytes = max_bytes
+        self.max_messages = max_messages
+        self.max_message_chars = max_message_chars
+        self._decoder = msgspec.json.Decoder()
+
+    def check_size(self, size):
+        # size: Content-Length (None if not sent) or bytes read so far
+        if size is not None and size > self.max_bytes:
+            raise InvalidRequest(f"Request body is over the {self.max_bytes} byte limit", 413)
+
+    def chat(self, body):
+        data, request = self._decode(body, ChatRequest)
+        if len(request.messages) > self.max_messages:
+            raise InvalidRequest(
+                f"{len(request.messages)} messages is over the limit of {self.max_messages}", 413
+            )
+        for i, message in enumerate(request.messages):
+            length = content_length(message.content)
+            if length > self.max_message_chars:
+                raise InvalidRequest(
+                    f"Message {i} has {length} characters; the limit is {self.max_message_chars}", 413
+                )
+        return data
+
+    def image(self, body):
+        data, request = self._decode(body, ImageRequest)
+        if len(request.prompt) > self.max_message_chars:
+            raise InvalidRequest(
+                f"Prompt has {len(request.prompt)} characters; the limit is {self.max_message_chars}", 413
+            )
+        return data
+
+    def _decode(self, body, schema):
+        # (decoded dict, typed view of it)
+        self.check_size(len(body))
+        try:
+            data = self._decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise InvalidRequest(f"Invalid JSON: {e}")
+        try:
+            return data, msgspec.convert(data, schema)
+        except msgspec.ValidationError as e:
+            raise InvalidRequest(str(e))